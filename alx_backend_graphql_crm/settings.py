@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -127,4 +128,129 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Graphene schema location
 GRAPHENE = {
     'SCHEMA': 'graphql_crm.schema.schema',
+    'RELAY_CONNECTION_MAX_LIMIT': 1000,
+}
+
+# Connections queried without first/last return DEFAULT_PAGE_SIZE edges;
+# RELAY_CONNECTION_MAX_LIMIT above caps what first/last may ask for.
+GRAPHQL_CONNECTIONS = {
+    'DEFAULT_PAGE_SIZE': 100,
+}
+
+# Cache backing the GraphQL response cache and totalCount. Invalidation
+# bumps tag versions stored in it, so every worker must share it: outside
+# DEBUG it defaults to Redis at CRM_CACHE_URL. The local-memory backend,
+# used in DEBUG when CRM_CACHE_URL is unset, is per process and only
+# correct with a single worker.
+CACHE_URL = os.environ.get('CRM_CACHE_URL', '' if DEBUG else 'redis://localhost:6379/2')
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+        if CACHE_URL
+        else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    ),
+}
+
+# GraphQL response cache: query results are served from CACHE (an alias
+# of CACHES) for TIMEOUT seconds, then stale for up to
+# STALE_WHILE_REVALIDATE seconds while a background refresh runs.
+GRAPHQL_RESPONSE_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 60,
+    'STALE_WHILE_REVALIDATE': 30,
+    'VARY_HEADERS': ['HTTP_AUTHORIZATION', 'HTTP_ACCEPT_LANGUAGE'],
+}
+
+# Successful GET requests (automatic persisted queries send the hash of a
+# registered document instead of its text) are cacheable by browsers
+# and CDNs for GRAPHQL_GET_MAX_AGE seconds; 0 leaves them uncacheable.
+# Requests carrying an Authorization header are never marked public.
+GRAPHQL_GET_MAX_AGE = 30
+
+# Serve /graphql with the async view when running under ASGI (asgi.py sets
+# CRM_GRAPHQL_ASYNC). Root query fields then resolve concurrently on a pool
+# of GRAPHQL_ASYNC_DB_WORKERS database threads.
+GRAPHQL_ASYNC = os.environ.get('CRM_GRAPHQL_ASYNC') == '1'
+GRAPHQL_ASYNC_DB_WORKERS = 8
+
+# Static query cost limit. Connection selections are weighted by their
+# page size and list fields by FANOUT ('Type.field': estimate, falling back
+# to DEFAULT_FANOUT). Operations above MAX_COST are rejected before they
+# run; 0 disables the limit. The cost is returned in response extensions.
+GRAPHQL_QUERY_COST = {
+    'MAX_COST': 50000,
+    'DEFAULT_FANOUT': 10,
+    'FANOUT': {
+        'OrderType.products': 5,
+    },
+}
+
+# totalCount on the CRM connections. Unfiltered counts are cached for
+# TIMEOUT seconds and dropped by the same mutations that invalidate the
+# response cache. totalCount(approximate: true) estimates filtered counts
+# from about SAMPLE_SIZE rows read in SAMPLE_RANGES key ranges spread
+# across the table.
+GRAPHQL_COUNTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 30,
+    'SAMPLE_SIZE': 10000,
+    'SAMPLE_RANGES': 100,
+}
+
+# Batched requests: /graphql accepts a JSON array of operations and answers
+# with an array. Batches larger than MAX_SIZE are rejected; with PARALLEL,
+# consecutive queries in a batch run concurrently.
+GRAPHQL_BATCH = {
+    'MAX_SIZE': 10,
+    'PARALLEL': True,
+}
+
+# SQL accounting: requests with an "X-GraphQL-Debug: sql" header get the
+# statements and database time of each operation, per resolver path, in
+# the "sql" response extension, along with suspected N+1 queries (the
+# same statement run N_PLUS_ONE_THRESHOLD times from one list field).
+# Honoured only with DEBUG or for staff users.
+GRAPHQL_SQL_REPORT = {
+    'HEADER': 'X-GraphQL-Debug',
+    'N_PLUS_ONE_THRESHOLD': 3,
+}
+
+# @defer/@stream: queries using them from clients that accept
+# multipart/mixed are answered incrementally. Streamed connection edges
+# are read from the database, and sent, STREAM_BATCH_SIZE at a time.
+GRAPHQL_INCREMENTAL = {
+    'STREAM_BATCH_SIZE': 100,
+}
+
+# Channel layer carrying subscription events between processes. The
+# in-memory layer only reaches subscribers in the same process, which is
+# enough for tests and a single ASGI worker; use channels_redis's
+# RedisChannelLayer when mutations and subscribers run in different
+# processes.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Weekly CRM report (crm.tasks.generate_crm_report): the order ids are
+# split into up to MAX_PARTITIONS ranges of about ORDERS_PER_PARTITION
+# ids, aggregated by parallel Celery tasks and merged by a chord callback.
+# TOP is the number of customers and products listed in the log.
+CRM_REPORT = {
+    'ORDERS_PER_PARTITION': 250000,
+    'MAX_PARTITIONS': 16,
+    'TOP': 5,
+}
+
+# Phone numbers typed without a "+" are taken as national numbers of
+# DEFAULT_COUNTRY_CODE when normalized for phone prefix filtering.
+CRM_PHONE = {
+    'DEFAULT_COUNTRY_CODE': '1',
+}
+
+# Bulk mutations (crm.bulk) look rows up and insert them CHUNK_SIZE at a
+# time; keep it under the database's bound-parameter limit.
+CRM_BULK = {
+    'CHUNK_SIZE': 500,
 }
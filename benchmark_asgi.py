@@ -0,0 +1,147 @@
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+CLIENTS = 50
+REQUESTS = 2000
+ORDERS = 5000
+PORT = 8765
+DATABASE = "/tmp/crm_asgi_benchmark.sqlite3"
+
+QUERY = """
+{
+  allOrders(first: 20, orderBy: ["-orderDate"]) {
+    edges { node { id totalAmount customer { name } products { name } } }
+  }
+  allCustomers(first: 20, orderBy: ["-createdAt"]) { edges { node { id name email } } }
+  allProducts(first: 20, orderBy: ["stock"]) { edges { node { id name stock } } }
+}
+"""
+
+
+def configure():
+    """Point Django at the scratch database, with the response cache off"""
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    settings.GRAPHQL_RESPONSE_CACHE = dict(settings.GRAPHQL_RESPONSE_CACHE, TIMEOUT=0)
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["127.0.0.1"]
+
+
+def setup():
+    """Create, migrate and fill a fresh scratch database"""
+    if os.path.exists(DATABASE):
+        os.remove(DATABASE)
+    configure()
+    django.setup()
+    from django.core.management import call_command
+    from django.db import transaction
+    call_command("migrate", verbosity=0)
+
+    from crm.models import Customer, Order, Product
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(500)]
+        )
+        products = Product.objects.bulk_create(
+            [Product(name=f"Product {i}", price=Decimal(10 + i % 90), stock=i % 40) for i in range(200)]
+        )
+        orders = Order.objects.bulk_create(
+            [Order(customer=customers[i % 500], total_amount=Decimal(i % 1000)) for i in range(ORDERS)]
+        )
+        Order.products.through.objects.bulk_create([
+            Order.products.through(order_id=order.pk, product_id=products[(order.pk + n) % 200].pk)
+            for order in orders
+            for n in range(3)
+        ])
+
+
+def serve(kind, port):
+    """Run /graphql under a threaded WSGI server or under Daphne"""
+    os.environ["CRM_GRAPHQL_ASYNC"] = "1" if kind == "asgi" else "0"
+    configure()
+    if kind == "asgi":
+        from daphne.cli import CommandLineInterface
+        CommandLineInterface().run(["-b", "127.0.0.1", "-p", str(port), "alx_backend_graphql_crm.asgi:application"])
+    else:
+        django.setup()
+        from django.core.servers.basehttp import WSGIServer, run
+        from django.core.wsgi import get_wsgi_application
+
+        class Server(WSGIServer):
+            # The default backlog of 10 resets connections under load
+            request_queue_size = CLIENTS * 2
+
+        run("127.0.0.1", port, get_wsgi_application(), threading=True, server_cls=Server)
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def post(url, body):
+    start = time.perf_counter()
+    request = urllib.request.Request(url, body, {"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        data = json.loads(response.read())
+    assert "errors" not in data, data["errors"]
+    return time.perf_counter() - start
+
+
+def load(name, port):
+    """Send REQUESTS queries from CLIENTS concurrent clients"""
+    url = f"http://127.0.0.1:{port}/graphql"
+    body = json.dumps({"query": QUERY}).encode()
+    post(url, body)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as clients:
+        latencies = sorted(clients.map(lambda _: post(url, body), range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    p95 = latencies[int(len(latencies) * 0.95)]
+    print(f"{name:<6} {REQUESTS / elapsed:>8.0f} req/s  p50 {statistics.median(latencies) * 1000:>7.1f} ms"
+          f"  p95 {p95 * 1000:>7.1f} ms")
+    return REQUESTS / elapsed
+
+
+def run(kind, port):
+    server = subprocess.Popen(
+        [sys.executable, __file__, "serve", kind, str(port)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for(port)
+        return load(kind.upper(), port)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(sys.argv[2], int(sys.argv[3]))
+        sys.exit()
+    if len(sys.argv) > 1:
+        REQUESTS = int(sys.argv[1])
+    setup()
+    print(f"{REQUESTS} requests from {CLIENTS} concurrent clients, three root connections each")
+    wsgi = run("wsgi", PORT)
+    asgi = run("asgi", PORT + 1)
+    print(f"\nASGI / WSGI: {asgi / wsgi:.2f}x")
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+SIZES = [1_000, 10_000, 100_000]
+DATABASE = "/tmp/crm_bulk_benchmark.sqlite3"
+
+
+def setup():
+    """Point Django at a fresh scratch database and migrate it"""
+    from django.conf import settings
+    if os.path.exists(DATABASE):
+        os.remove(DATABASE)
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def make_rows(count, tag):
+    """Rows as an import sends them: 1% invalid emails, 1% existing ones, some repeats"""
+    rows = []
+    for i in range(count):
+        email = f"{tag}{i}@example.com"
+        if i % 100 == 1:
+            email = "not-an-email"
+        elif i % 100 == 2:
+            email = "existing@example.com"
+        elif i % 100 == 3:
+            email = f"{tag}{i - 3}@example.com"
+        rows.append({"name": f"Customer {i}", "email": email, "phone": "415-555-%04d" % (i % 10000)})
+    return rows
+
+
+def per_row(rows):
+    """The former BulkCreateCustomers loop: an exists() and a save() per row"""
+    from django.core.validators import validate_email
+    from django.db import transaction
+
+    from crm.models import Customer
+    created, errors = [], []
+    with transaction.atomic():
+        for idx, data in enumerate(rows):
+            try:
+                validate_email(data.get("email"))
+                if Customer.objects.filter(email=data["email"]).exists():
+                    raise Exception(f"Email already exists: {data['email']}")
+                if data.get("phone") and not re.match(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$", data["phone"]):
+                    raise Exception(f"Invalid phone format: {data['phone']}")
+                customer = Customer(name=data["name"], email=data["email"], phone=data.get("phone"))
+                customer.save()
+                created.append(customer)
+            except Exception as e:
+                errors.append(f"Row {idx+1}: {str(e)}")
+    return created, errors
+
+
+def set_based(rows):
+    from django.db import transaction
+
+    from crm.bulk import create_customers
+    with transaction.atomic():
+        return create_customers(rows)
+
+
+def measure(name, create, rows):
+    from django.db import connection
+    queries = []
+    with connection.execute_wrapper(lambda execute, sql, params, many, context: queries.append(sql) or execute(sql, params, many, context)):
+        start = time.perf_counter()
+        created, errors = create(rows)
+        elapsed = time.perf_counter() - start
+    print(f"{name:<10} {len(rows):>7} rows {elapsed:>8.2f} s {len(rows) / elapsed:>9.0f} rows/s "
+          f"{len(queries):>7} queries {len(created):>7} created {len(errors):>5} errors")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        SIZES = [int(size) for size in sys.argv[1:]]
+    setup()
+    from crm.models import Customer
+    Customer.objects.create(name="Existing", email="existing@example.com")
+    for size in SIZES:
+        measure("per-row", per_row, make_rows(size, f"p{size}-"))
+        measure("set-based", set_based, make_rows(size, f"s{size}-"))
@@ -0,0 +1,94 @@
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+SIZES = [1_000, 10_000]
+CUSTOMERS = 5_000
+PRODUCTS = 2_000
+LINES = 3
+DATABASE = "/tmp/crm_orders_benchmark.sqlite3"
+
+CREATE = """
+mutation($customerId: ID!, $productIds: [ID]!, $orderDate: DateTime) {
+  createOrder(customerId: $customerId, productIds: $productIds, orderDate: $orderDate) { success }
+}
+"""
+BULK = """
+mutation($orders: [OrderInput]!) {
+  bulkCreateOrders(orders: $orders) { errors created { id } }
+}
+"""
+
+
+def setup():
+    """Point Django at a fresh scratch database, migrate and fill it"""
+    from django.conf import settings
+    if os.path.exists(DATABASE):
+        os.remove(DATABASE)
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    from django.db import transaction
+    call_command("migrate", verbosity=0)
+
+    from crm.models import Customer, Product
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(CUSTOMERS)]
+        )
+        Product.objects.bulk_create(
+            [Product(name=f"Product {i}", price=Decimal(100 + i % 9900) / 100, stock=100) for i in range(PRODUCTS)]
+        )
+
+
+def replay(count):
+    """A day of POS orders, as order mutation variables"""
+    from crm.models import Customer, Product
+    customer_ids = list(Customer.objects.values_list("id", flat=True))
+    product_ids = list(Product.objects.values_list("id", flat=True))
+    return [
+        {
+            "customerId": random.choice(customer_ids),
+            "productIds": random.sample(product_ids, LINES),
+            "orderDate": f"2024-03-01T{i * 86400 // count // 3600:02}:{i * 86400 // count // 60 % 60:02}:00+00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def execute(query, variables):
+    """Run an operation through the schema, as one request would"""
+    from graphene_django.settings import graphene_settings
+    from django.test import RequestFactory
+
+    from crm.loaders import Loaders
+    request = RequestFactory().post("/graphql")
+    request.loaders = Loaders()
+    result = graphene_settings.SCHEMA.execute(query, variables=variables, context_value=request)
+    assert not result.errors, result.errors
+    return result.data
+
+
+def timed(name, count, run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count:>7} orders {elapsed:>8.2f} s {count / elapsed:>9.0f} orders/s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        SIZES = [int(size) for size in sys.argv[1:]]
+    random.seed(0)
+    setup()
+    for size in SIZES:
+        orders = replay(size)
+        timed("createOrder per order", size, lambda: [execute(CREATE, order) for order in orders])
+        timed("bulkCreateOrders", size, lambda: execute(BULK, {"orders": orders}))
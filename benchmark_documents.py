@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+ORDERS = 200
+REQUESTS = 2000
+DATABASE = "/tmp/crm_documents_benchmark.sqlite3"
+
+QUERY = """
+query RecentOrders($first: Int, $after: String) {
+  allOrders(first: $first, after: $after, orderBy: ["-orderDate"]) {
+    totalCount
+    pageInfo { hasNextPage endCursor }
+    edges {
+      cursor
+      node {
+        id
+        orderDate
+        totalAmount
+        customer { id name email phone }
+        products { id name price stock }
+      }
+    }
+  }
+}
+"""
+
+
+def setup():
+    """Point Django at a fresh scratch database, migrate and fill it"""
+    from django.conf import settings
+    if os.path.exists(DATABASE):
+        os.remove(DATABASE)
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    from django.db import transaction
+    call_command("migrate", verbosity=0)
+
+    from crm.models import Customer, Order, Product
+    with transaction.atomic():
+        customers = Customer.objects.bulk_create(
+            [Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(50)]
+        )
+        products = Product.objects.bulk_create(
+            [Product(name=f"Product {i}", price=Decimal(10 + i), stock=i) for i in range(20)]
+        )
+        orders = Order.objects.bulk_create(
+            [Order(customer=customers[i % 50], total_amount=Decimal(i)) for i in range(ORDERS)]
+        )
+        Order.products.through.objects.bulk_create([
+            Order.products.through(order_id=order.pk, product_id=products[order.pk % 20].pk) for order in orders
+        ])
+
+
+def view(document_cache):
+    """The /graphql view with the given document cache and no response cache"""
+    from crm.response_cache import ResponseCache
+    from crm.views import CRMGraphQLView
+    attrs = {"document_cache": document_cache, "response_cache": ResponseCache(timeout=0)}
+    return type("BenchmarkView", (CRMGraphQLView,), attrs).as_view()
+
+
+def measure(name, handler):
+    """CPU time per request, with a small page so parsing is a visible share"""
+    from django.test import RequestFactory
+    factory = RequestFactory()
+    body = json.dumps({"query": QUERY, "variables": {"first": 5}})
+
+    def request():
+        response = handler(factory.post("/graphql", body, content_type="application/json"))
+        assert response.status_code == 200, response.content
+
+    request()
+    start = time.process_time()
+    for _ in range(REQUESTS):
+        request()
+    elapsed = (time.process_time() - start) / REQUESTS * 1000
+    print(f"{name:<24} {elapsed:>8.3f} ms CPU per request")
+    return elapsed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        REQUESTS = int(sys.argv[1])
+    setup()
+    from crm.documents import DocumentCache
+    print(f"allOrders(first: 5), {REQUESTS} requests through the view")
+    # A cache that holds nothing parses and validates every request
+    uncached = measure("parse and validate", view(DocumentCache(maxsize=0)))
+    cached = measure("document cache", view(DocumentCache()))
+    print(f"\nSaved {uncached - cached:.3f} ms CPU per request ({(uncached - cached) / uncached:.0%})")
@@ -0,0 +1,52 @@
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from crm.encoding import default, encode_json, encode_msgpack, msgpack, orjson
+
+# Configuration
+ORDERS = 5000
+REPEAT = 20
+
+
+def order_page(count):
+    """An allOrders response with ``count`` orders, as the view encodes it"""
+    random.seed(0)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    edges = []
+    for i in range(1, count + 1):
+        products = [
+            {"id": str(random.randint(1, 500)), "name": f"Product {i}-{n}",
+             "price": Decimal(random.randint(100, 99999)) / 100}
+            for n in range(random.randint(1, 5))
+        ]
+        edges.append({"node": {
+            "id": str(i),
+            "orderDate": start + timedelta(minutes=i),
+            "totalAmount": sum(p["price"] for p in products),
+            "customer": {"id": str(i % 300), "name": f"Customer {i % 300}",
+                         "email": f"customer{i % 300}@example.com"},
+            "products": products,
+        }})
+    return {"data": {"allOrders": {"edges": edges}}}
+
+
+def measure(name, encode, data):
+    encoded = encode(data)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        encode(data)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    print(f"{name:<12} {len(encoded):>10,} bytes {elapsed * 1000:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    data = order_page(ORDERS)
+    print(f"Encoding a {ORDERS}-order page, mean of {REPEAT} runs")
+    measure("json", lambda d: json.dumps(d, separators=(",", ":"), default=default), data)
+    if orjson is not None:
+        measure("orjson", encode_json, data)
+    if msgpack is not None:
+        measure("msgpack", encode_msgpack, data)
@@ -0,0 +1,122 @@
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+ORDERS = 1_000_000
+CUSTOMERS = 50_000
+PRODUCTS = 5_000
+REPEAT = 5
+PAGE = 50
+DATABASE = "/tmp/crm_index_benchmark.sqlite3"
+
+
+def setup():
+    """Point Django at a scratch database and migrate it"""
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def populate():
+    """Fill the database once; later runs reuse it"""
+    from crm.models import Customer, Order, Product
+    if Order.objects.count() >= ORDERS:
+        return
+    random.seed(0)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    print(f"Creating {CUSTOMERS} customers, {PRODUCTS} products and {ORDERS} orders...")
+    Customer.objects.bulk_create(
+        [Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(CUSTOMERS)],
+        batch_size=5000,
+    )
+    Product.objects.bulk_create(
+        [Product(name=f"Product {i}", price=Decimal(random.randint(100, 99999)) / 100,
+                 stock=random.randint(0, 500)) for i in range(PRODUCTS)],
+        batch_size=5000,
+    )
+    customer_ids = list(Customer.objects.values_list("id", flat=True))
+    for offset in range(0, ORDERS, 20_000):
+        Order.objects.bulk_create([
+            Order(customer_id=random.choice(customer_ids),
+                  total_amount=Decimal(random.randint(100, 500000)) / 100,
+                  order_date=start + timedelta(seconds=(n + 1) * 47 % 63072000))
+            for n in range(offset, min(offset + 20_000, ORDERS))
+        ])
+    # created_at is auto_now_add, so spread the dates out afterwards
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE crm_customer SET created_at = datetime(%s, '+' || (id * 631 %% 63072000) || ' seconds')",
+            [start.strftime("%Y-%m-%d %H:%M:%S")],
+        )
+        cursor.execute("ANALYZE")
+
+
+def cases():
+    """The querysets behind common filter and orderBy combinations, first page only"""
+    from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+    from crm.models import Customer, Order, Product
+    week = {"order_date_gte": "2024-03-01T00:00:00+00:00", "order_date_lte": "2024-03-08T00:00:00+00:00"}
+    return [
+        ("orders by date range", OrderFilter(week, Order.objects.all()).qs.order_by("order_date", "id")),
+        ("orders by amount", OrderFilter({"total_amount_gte": "4900"}, Order.objects.all()).qs.order_by("-total_amount", "-id")),
+        ("latest orders", Order.objects.order_by("-order_date", "-id")),
+        ("orders of a customer", Order.objects.filter(customer_id=4242).order_by("-order_date")),
+        ("products by price", ProductFilter({"price_gte": "500", "price_lte": "510"}, Product.objects.all()).qs.order_by("price", "id")),
+        ("low stock products", ProductFilter({"stock_lte": "3"}, Product.objects.all()).qs.order_by("stock", "id")),
+        ("customers by signup", CustomerFilter({"created_at_gte": "2024-06-01T00:00:00+00:00", "created_at_lte": "2024-06-02T00:00:00+00:00"}, Customer.objects.all()).qs.order_by("created_at", "id")),
+    ]
+
+
+def measure(queryset):
+    list(queryset[:PAGE])
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        list(queryset[:PAGE])
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+def filter_indexes():
+    from crm.models import Customer, Order, Product
+    return [(model, index) for model in (Customer, Product, Order) for index in model._meta.indexes]
+
+
+def run(label):
+    print(f"\n{label}")
+    results = {}
+    for name, queryset in cases():
+        results[name] = measure(queryset)
+        print(f"{name:<24} {results[name]:>9.2f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        ORDERS = int(sys.argv[1])
+    setup()
+    populate()
+    from django.db import connection
+    print(f"First page of {PAGE} rows over {ORDERS} orders, mean of {REPEAT} runs")
+    with connection.schema_editor() as editor:
+        for model, index in filter_indexes():
+            editor.remove_index(model, index)
+    before = run("Without the filter indexes")
+    with connection.schema_editor() as editor:
+        for model, index in filter_indexes():
+            editor.add_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    after = run("With the filter indexes")
+    print()
+    for name in before:
+        print(f"{name:<24} {before[name]:>9.2f} ms -> {after[name]:>8.2f} ms ({before[name] / after[name]:.0f}x)")
@@ -0,0 +1,86 @@
+import os
+import random
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+CUSTOMERS = 5_000_000
+REPEAT = 5
+PAGE = 50
+DATABASE = "/tmp/crm_phone_benchmark.sqlite3"
+PREFIXES = ["+1415", "415-55", "+4420", "+1212555"]
+
+
+def setup():
+    """Point Django at a scratch database and migrate it"""
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def random_phone():
+    """A phone number in one of the formats CreateCustomer accepts"""
+    if random.random() < 0.5:
+        return "{}-{:03}-{:04}".format(random.choice(["415", "212", "646", "312"]),
+                                       random.randint(0, 999), random.randint(0, 9999))
+    country = random.choice(["1", "44", "49", "33"])
+    return "+" + country + "".join(random.choice("0123456789") for _ in range(10))
+
+
+def populate():
+    """Fill the database once; later runs reuse it"""
+    from django.db import connection, transaction
+
+    from crm.models import Customer
+    from crm.phones import normalize_phone
+    if Customer.objects.count() >= CUSTOMERS:
+        return
+    random.seed(0)
+    print(f"Creating {CUSTOMERS} customers...")
+    # Triggers of the search index would dominate the load time
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER IF EXISTS crm_customer_search_insert")
+    for offset in range(0, CUSTOMERS, 100_000):
+        rows = []
+        for i in range(offset, min(offset + 100_000, CUSTOMERS)):
+            phone = random_phone()
+            rows.append((f"Customer {i}", f"customer{i}@example.com", phone, normalize_phone(phone)))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO crm_customer (name, email, phone, phone_digits, created_at, order_count, lifetime_value)"
+                " VALUES (%s, %s, %s, %s, datetime('now'), 0, 0)",
+                rows,
+            )
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO crm_customer_search(crm_customer_search) VALUES ('rebuild')")
+        cursor.execute("ANALYZE")
+
+
+def measure(queryset):
+    page = list(queryset[:PAGE])
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        list(queryset[:PAGE])
+        queryset.count()
+    return (time.perf_counter() - start) / REPEAT * 1000, len(page), queryset.count()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        CUSTOMERS = int(sys.argv[1])
+    setup()
+    populate()
+    from crm.filters import CustomerFilter
+    from crm.models import Customer
+    print(f"First page of {PAGE} customers plus the match count over {CUSTOMERS} customers, mean of {REPEAT} runs")
+    print(f"{'prefix':<12} {'phone__startswith':>24} {'phone_digits range':>24}")
+    for prefix in PREFIXES:
+        before, _, before_count = measure(Customer.objects.filter(phone__startswith=prefix).order_by("pk"))
+        after, _, after_count = measure(CustomerFilter({"phone_pattern": prefix}, Customer.objects.all()).qs.order_by("phone_digits", "pk"))
+        print(f"{prefix:<12} {before:>11.2f} ms {before_count:>8} rows {after:>11.2f} ms {after_count:>8} rows")
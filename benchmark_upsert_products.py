@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
+
+# Configuration
+SIZES = [1_000, 10_000]
+DATABASE = "/tmp/crm_upsert_benchmark.sqlite3"
+
+CREATE = """
+mutation($name: String!, $price: Decimal!, $stock: Int) {
+  createProduct(name: $name, price: $price, stock: $stock) { success }
+}
+"""
+UPSERT = """
+mutation($products: [ProductInput!]!) {
+  upsertProducts(products: $products) { created updated results { status } }
+}
+"""
+
+
+def setup():
+    """Point Django at a fresh scratch database and migrate it"""
+    from django.conf import settings
+    if os.path.exists(DATABASE):
+        os.remove(DATABASE)
+    settings.DATABASES["default"]["NAME"] = DATABASE
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", verbosity=0)
+
+
+def catalog(count, tag, revision=0):
+    return [
+        {"sku": f"{tag}-{i}", "name": f"Product {i} r{revision}", "price": f"{10 + i % 500}.{revision:02}", "stock": i % 40}
+        for i in range(count)
+    ]
+
+
+def execute(query, variables):
+    """Run an operation through the schema, as one request would"""
+    from graphene_django.settings import graphene_settings
+    from django.test import RequestFactory
+
+    from crm.loaders import Loaders
+    request = RequestFactory().post("/graphql")
+    request.loaders = Loaders()
+    result = graphene_settings.SCHEMA.execute(query, variables=variables, context_value=request)
+    assert not result.errors, result.errors
+    return result.data
+
+
+def timed(name, count, run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count:>7} products {elapsed:>8.2f} s {count / elapsed:>9.0f} products/s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        SIZES = [int(size) for size in sys.argv[1:]]
+    setup()
+    for size in SIZES:
+        rows = catalog(size, f"loop{size}")
+        timed("createProduct per product", size, lambda: [
+            execute(CREATE, {"name": row["name"], "price": row["price"], "stock": row["stock"]}) for row in rows
+        ])
+        timed("upsertProducts (insert)", size, lambda: execute(UPSERT, {"products": catalog(size, f"bulk{size}")}))
+        timed("upsertProducts (update)", size, lambda: execute(UPSERT, {"products": catalog(size, f"bulk{size}", 1)}))
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class CrmConfig(AppConfig):
+    name = 'crm'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from .search import restore_search_triggers
+
+        post_migrate.connect(restore_search_triggers, sender=self)
@@ -0,0 +1,262 @@
+"""Set-based bulk mutations.
+
+Rows are validated in memory, looked up with one chunked IN query per
+referenced table and inserted with chunked bulk_create, so the number of
+queries grows with the number of chunks rather than rows. Rows that fail
+validation are reported by index and skipped; the rest go through.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import customer_stats
+from .models import Customer, Order, Product
+from .phones import normalize_phone
+from .response_cache import response_cache
+from .rollups import record_orders
+from .subscriptions import ORDER_CREATED, PRODUCT_STOCK_CHANGED, publish_many_on_commit, publish_on_commit
+
+_options = getattr(settings, 'CRM_BULK', {})
+CHUNK_SIZE = _options.get('CHUNK_SIZE', 500)
+
+CREATED = 'created'
+UPDATED = 'updated'
+ERROR = 'error'
+
+PHONE_PATTERN = re.compile(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$")
+
+
+def chunked(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def existing_values(queryset, field, values):
+    """The ``values`` already stored in ``field``, one IN query per chunk."""
+    found = set()
+    for chunk in chunked(list(values)):
+        found.update(queryset.filter(**{f'{field}__in': chunk}).values_list(field, flat=True))
+    return found
+
+
+def create_customers(rows):
+    """Validate and insert customer ``rows``, mappings of name, email and phone.
+
+    Returns ``(created, errors)``: the new customers in row order and
+    ``{index: message}`` for the rejected rows. Checks run in the order
+    of the former per-row mutation, so each row gets the same message;
+    an email repeated within the batch counts as existing from its
+    second accepted occurrence. Call inside a transaction.
+    """
+    errors = {}
+    for index, row in enumerate(rows):
+        try:
+            validate_email(row.get('email'))
+        except DjangoValidationError as e:
+            errors[index] = str(e)
+    existing = existing_values(
+        Customer.objects, 'email', {row['email'] for index, row in enumerate(rows) if index not in errors}
+    )
+
+    accepted = []
+    for index, row in enumerate(rows):
+        if index in errors:
+            continue
+        email, phone = row['email'], row.get('phone')
+        if email in existing:
+            errors[index] = f"Email already exists: {email}"
+        elif phone and not PHONE_PATTERN.match(phone):
+            errors[index] = f"Invalid phone format: {phone}"
+        elif not row.get('name'):
+            errors[index] = "Name is required."
+        else:
+            existing.add(email)
+            accepted.append((index, Customer(
+                name=row['name'], email=email, phone=phone, phone_digits=normalize_phone(phone)
+            )))
+
+    created = []
+    for chunk in chunked(accepted):
+        created.extend(_insert_customers(chunk, errors))
+    if created:
+        response_cache.invalidate_on_commit(Customer)
+    return created, errors
+
+
+def _insert_customers(chunk, errors):
+    try:
+        with transaction.atomic():
+            return Customer.objects.bulk_create([customer for _, customer in chunk])
+    except IntegrityError:
+        # An email was taken since the lookup: report it and retry the rest
+        taken = existing_values(Customer.objects, 'email', [customer.email for _, customer in chunk])
+        for index, customer in chunk:
+            if customer.email in taken:
+                errors[index] = f"Email already exists: {customer.email}"
+        remaining = [customer for _, customer in chunk if customer.email not in taken]
+        return Customer.objects.bulk_create(remaining)
+
+
+def _product_error(row):
+    """The CreateProduct validation message for ``row``, or None if it is valid."""
+    if not row.get('sku'):
+        return "SKU is required."
+    if not row.get('name'):
+        return "Name is required."
+    try:
+        price = Decimal(row.get('price'))
+    except (TypeError, ValueError, InvalidOperation):
+        return "Invalid price."
+    if not price > 0:
+        return "Price must be positive."
+    if row.get('stock') is not None and row['stock'] < 0:
+        return "Stock cannot be negative."
+    return None
+
+
+def upsert_products(rows):
+    """Create or update products by SKU, from mappings of sku, name, price and stock.
+
+    Returns one ``(status, product, message)`` per row, in row order, with
+    status CREATED, UPDATED or ERROR. Rows are validated up front; each
+    chunk is then looked up and written with one INSERT ... ON CONFLICT in
+    its own transaction, so a failing chunk does not undo the ones before
+    it. A SKU repeated within the batch is taken from its first row, and
+    rows without a stock keep the stored one.
+    """
+    results = [None] * len(rows)
+    seen = set()
+    valid = []
+    for index, row in enumerate(rows):
+        message = _product_error(row)
+        if message is None and row['sku'] in seen:
+            message = f"SKU {row['sku']} appears more than once."
+        if message is not None:
+            results[index] = (ERROR, None, message)
+            continue
+        seen.add(row['sku'])
+        valid.append(index)
+
+    for chunk in chunked(valid):
+        try:
+            with transaction.atomic():
+                for index, status, product in _upsert_chunk([(index, rows[index]) for index in chunk]):
+                    results[index] = (status, product, None)
+        except Exception as e:
+            for index in chunk:
+                results[index] = (ERROR, None, str(e))
+    return results
+
+
+def _upsert_chunk(chunk):
+    # A SKU inserted concurrently after this lookup is reported as created
+    # although the upsert updated it
+    stock = dict(
+        Product.objects.filter(sku__in=[row['sku'] for _, row in chunk]).values_list('sku', 'stock')
+    )
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                sku=row['sku'],
+                name=row['name'],
+                price=Decimal(row['price']),
+                stock=row['stock'] if row.get('stock') is not None else stock.get(row['sku'], 0),
+            )
+            for _, row in chunk
+        ],
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=['name', 'price', 'stock'],
+    )
+    restocked = [product.pk for product in products if product.sku in stock and stock[product.sku] != product.stock]
+    response_cache.invalidate_on_commit(Product)
+    if restocked:
+        publish_on_commit(PRODUCT_STOCK_CHANGED, {"ids": restocked})
+    return [
+        (index, UPDATED if product.sku in stock else CREATED, product)
+        for (index, _), product in zip(chunk, products)
+    ]
+
+
+def _pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def create_orders(rows):
+    """Validate and insert orders from mappings of customer_id, product_ids and order_date.
+
+    Returns ``(created, errors)``: ``(order, products)`` pairs in row order
+    and ``{index: message}`` for the rejected rows, with the messages of
+    CreateOrder. Customers and products are each resolved with one lookup
+    for the whole batch and totals are computed in memory. Each chunk
+    inserts its orders and order lines, and updates the rollups and
+    customer counters, in its own transaction, so a failing chunk does not
+    undo the ones before it.
+    """
+    errors = {}
+    customer_ids = {}
+    product_ids = {}
+    for index, row in enumerate(rows):
+        customer_ids[index] = _pk(row.get('customer_id'))
+        product_ids[index] = [_pk(pk) for pk in row.get('product_ids') or []]
+    customers = Customer.objects.in_bulk({pk for pk in customer_ids.values() if pk is not None})
+    products = Product.objects.in_bulk(
+        {pk for pks in product_ids.values() for pk in pks if pk is not None}
+    )
+
+    accepted = []
+    for index, row in enumerate(rows):
+        customer = customers.get(customer_ids[index])
+        pks = set(product_ids[index])
+        if customer is None:
+            errors[index] = "Invalid customer ID."
+        elif not pks:
+            errors[index] = "At least one product must be selected."
+        elif not pks <= products.keys():
+            errors[index] = "Invalid product ID."
+        else:
+            lines = [products[pk] for pk in sorted(pks)]
+            order = Order(
+                customer=customer,
+                order_date=row.get('order_date') or timezone.now(),
+                total_amount=sum((product.price for product in lines), Decimal('0')),
+            )
+            accepted.append((index, order, lines))
+
+    created = []
+    for chunk in chunked(accepted):
+        try:
+            with transaction.atomic():
+                _insert_orders(chunk)
+        except Exception as e:
+            for index, _, _ in chunk:
+                errors[index] = str(e)
+        else:
+            created.extend((order, lines) for _, order, lines in chunk)
+
+    # The counters moved in the database; hand back current customers
+    current = Customer.objects.in_bulk({order.customer_id for order, _ in created})
+    for order, _ in created:
+        order.customer = current.get(order.customer_id, order.customer)
+    return created, errors
+
+
+def _insert_orders(chunk):
+    orders = Order.objects.bulk_create([order for _, order, _ in chunk])
+    Order.products.through.objects.bulk_create([
+        Order.products.through(order_id=order.pk, product_id=product.pk)
+        for order, (_, _, lines) in zip(orders, chunk)
+        for product in lines
+    ])
+    record_orders(orders, {order.pk: len(lines) for order, (_, _, lines) in zip(orders, chunk)})
+    customer_stats.add_orders(orders)
+    response_cache.invalidate_on_commit(Order)
+    publish_many_on_commit(ORDER_CREATED, [{"id": order.pk} for order in orders])
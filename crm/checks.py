@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_MEMORY_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Warn when the response or count cache lives in each worker's memory.
+
+    Invalidation bumps tag versions in the cache, so a per-process cache
+    leaves the other workers serving stale responses until they expire.
+    """
+    from .counts import COUNT_CACHE
+    from .response_cache import response_cache
+
+    warnings = []
+    for setting, alias in (('GRAPHQL_RESPONSE_CACHE', response_cache.cache_alias), ('GRAPHQL_COUNTS', COUNT_CACHE)):
+        if settings.CACHES.get(alias, {}).get('BACKEND') == LOCAL_MEMORY_CACHE:
+            warnings.append(Warning(
+                "{} uses the local-memory cache '{}', which each worker keeps to itself.".format(setting, alias),
+                hint='Point it at a shared backend such as Redis (CRM_CACHE_URL), '
+                     'or run a single worker.',
+                id='crm.W001',
+            ))
+    return warnings
@@ -0,0 +1,190 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.utils.encoding import force_str
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView
+from graphql import ExecutionResult, OperationType, get_operation_ast
+from graphql.execution import create_source_event_stream
+
+from .documents import document_cache
+from .encoding import encode_json
+from .execution import execute_concurrently
+from .persisted import query_hash
+
+PROTOCOL = 'graphql-transport-ws'
+
+
+def format_result(result):
+    payload = {}
+    if result.errors:
+        payload['errors'] = [GraphQLView.format_error(e) for e in result.errors]
+    if result.data is not None or not result.errors:
+        payload['data'] = result.data
+    return force_str(encode_json(payload))
+
+
+class SharedSubscription:
+    """One execution of a subscription, fanned out to every socket on it.
+
+    Subscribers sending the same document, variables and operation name
+    share it, so each event is resolved and encoded once however many
+    sockets receive it. Nothing in the schema depends on the user, so this
+    is safe to share across connections.
+    """
+
+    def __init__(self, key, schema, document, variables, operation_name):
+        self.key = key
+        self.schema = schema
+        self.document = document
+        self.variables = variables
+        self.operation_name = operation_name
+        self.subscribers = set()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        context = SimpleNamespace(loaders=None)
+        try:
+            stream = await create_source_event_stream(
+                self.schema, self.document, None, context, self.variables, self.operation_name
+            )
+            if isinstance(stream, ExecutionResult):
+                await self.broadcast(format_result(stream))
+                return
+            async for event in stream:
+                # Loaders cache rows, so each event gets fresh ones
+                context.loaders = None
+                result = await execute_concurrently(
+                    self.schema,
+                    self.document,
+                    root_value=event,
+                    context_value=context,
+                    variable_values=self.variables,
+                    operation_name=self.operation_name,
+                )
+                await self.broadcast(format_result(result))
+        finally:
+            if subscriptions.get(self.key) is self:
+                del subscriptions[self.key]
+            await asyncio.gather(
+                *(consumer.complete(id) for consumer, id in list(self.subscribers)),
+                return_exceptions=True,
+            )
+
+    async def broadcast(self, payload):
+        await asyncio.gather(
+            *(consumer.send_next(id, payload) for consumer, id in list(self.subscribers)),
+            return_exceptions=True,
+        )
+
+
+# Running subscriptions of this process, by document, variables and operation
+subscriptions = {}
+
+
+class GraphQLWebsocketConsumer(AsyncWebsocketConsumer):
+    """Subscriptions over the graphql-transport-ws protocol.
+
+    Only subscription operations are accepted; queries and mutations go
+    through /graphql over HTTP.
+    """
+
+    async def connect(self):
+        if PROTOCOL not in self.scope.get('subprotocols', []):
+            await self.close()
+            return
+        self.initialised = False
+        self.operations = {}
+        await self.accept(PROTOCOL)
+
+    async def disconnect(self, code):
+        for id in list(getattr(self, 'operations', ())):
+            self.unsubscribe(id)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+            message_type = message['type']
+        except (ValueError, TypeError, KeyError):
+            await self.close(code=4400)
+            return
+
+        if message_type == 'connection_init':
+            if self.initialised:
+                await self.close(code=4429)
+                return
+            self.initialised = True
+            await self.send_message({'type': 'connection_ack'})
+        elif message_type == 'ping':
+            await self.send_message({'type': 'pong'})
+        elif message_type == 'pong':
+            pass
+        elif message_type == 'subscribe':
+            if not self.initialised:
+                await self.close(code=4401)
+                return
+            id = message.get('id')
+            if id in self.operations:
+                await self.close(code=4409)
+                return
+            await self.subscribe(id, message.get('payload') or {})
+        elif message_type == 'complete':
+            self.unsubscribe(message.get('id'))
+        else:
+            await self.close(code=4400)
+
+    async def subscribe(self, id, payload):
+        query = payload.get('query')
+        variables = payload.get('variables') or {}
+        operation_name = payload.get('operationName')
+        schema = graphene_settings.SCHEMA.graphql_schema
+        if not isinstance(query, str):
+            await self.send_error(id, 'Must provide query string.')
+            return
+        document, errors = document_cache.get(schema, query)
+        if document is None or errors:
+            await self.send_message({
+                'id': id, 'type': 'error', 'payload': [GraphQLView.format_error(e) for e in errors]
+            })
+            return
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None or operation_ast.operation != OperationType.SUBSCRIPTION:
+            await self.send_error(id, 'Only subscription operations are supported over WebSocket.')
+            return
+
+        key = (query_hash(query), json.dumps(variables, sort_keys=True), operation_name)
+        shared = subscriptions.get(key)
+        if shared is None:
+            shared = subscriptions[key] = SharedSubscription(key, schema, document, variables, operation_name)
+            shared.start()
+        shared.subscribers.add((self, id))
+        self.operations[id] = shared
+
+    def unsubscribe(self, id):
+        shared = self.operations.pop(id, None)
+        if shared is None:
+            return
+        shared.subscribers.discard((self, id))
+        if not shared.subscribers:
+            if subscriptions.get(shared.key) is shared:
+                del subscriptions[shared.key]
+            shared.task.cancel()
+
+    async def send_next(self, id, payload):
+        # The payload is encoded once for all subscribers
+        await self.send(text_data='{{"id":{},"type":"next","payload":{}}}'.format(json.dumps(id), payload))
+
+    async def complete(self, id):
+        if self.operations.pop(id, None) is not None:
+            await self.send_message({'id': id, 'type': 'complete'})
+
+    async def send_error(self, id, message):
+        await self.send_message({'id': id, 'type': 'error', 'payload': [{'message': message}]})
+
+    async def send_message(self, message):
+        await self.send(text_data=force_str(encode_json(message)))
@@ -0,0 +1,90 @@
+from django.conf import settings
+from graphene.relay import Connection
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FragmentDefinitionNode,
+    get_named_type,
+    get_nullable_type,
+    is_abstract_type,
+    is_list_type,
+    is_object_type,
+)
+from graphql.execution.values import get_argument_values
+
+from .fields import DEFAULT_PAGE_SIZE
+from .optimizer import selected_fields
+
+
+class CostAnalyzer:
+    """Static cost estimate of an operation, computed before execution.
+
+    Every object a field returns costs 1 plus the cost of its selection.
+    A connection's ``edges`` return as many objects as the page size
+    (``first``/``last``, else the default page size) and other list fields
+    their estimated fan-out. Unions and interfaces cost as much as their
+    most expensive member. Scalars are free.
+    """
+
+    def __init__(self, max_cost=0, default_fanout=10, fanout=None, page_size=None):
+        self.max_cost = max_cost
+        self.default_fanout = default_fanout
+        self.fanout = fanout or {}
+        self.page_size = page_size
+
+    def cost(self, schema, document, operation_ast, variables=None):
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        root_type = schema.get_root_type(operation_ast.operation)
+        return self._selection_cost(
+            schema, root_type, operation_ast.selection_set, fragments, variables or {}, None
+        )
+
+    def _selection_cost(self, schema, parent_type, selection_set, fragments, variables, edges_count):
+        total = 0
+        for node in selected_fields(fragments, selection_set):
+            field_def = parent_type.fields.get(node.name.value)
+            if field_def is None:
+                continue
+            field_type = get_named_type(field_def.type)
+            if not (is_object_type(field_type) or is_abstract_type(field_type)) or node.name.value.startswith('__'):
+                continue
+            page_size = None
+            if self._is_connection(field_type):
+                args = get_argument_values(field_def, node, variables)
+                page_size = args.get('first') or args.get('last') or self._default_page_size()
+            child = 0
+            if node.selection_set:
+                # Fields on the other members of an abstract type are skipped
+                members = schema.get_possible_types(field_type) if is_abstract_type(field_type) else [field_type]
+                child = max(
+                    (self._selection_cost(schema, member, node.selection_set, fragments, variables, page_size)
+                     for member in members),
+                    default=0,
+                )
+            count = 1
+            if edges_count is not None and node.name.value == 'edges':
+                count = edges_count
+            elif is_list_type(get_nullable_type(field_def.type)):
+                key = '{}.{}'.format(parent_type.name, node.name.value)
+                count = self.fanout.get(key, self.default_fanout)
+            total += count * (1 + child)
+        return total
+
+    def _is_connection(self, graphql_type):
+        graphene_type = getattr(graphql_type, 'graphene_type', None)
+        return isinstance(graphene_type, type) and issubclass(graphene_type, Connection)
+
+    def _default_page_size(self):
+        return self.page_size or graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 1
+
+
+_options = getattr(settings, 'GRAPHQL_QUERY_COST', {})
+cost_analyzer = CostAnalyzer(
+    max_cost=_options.get('MAX_COST', 0),
+    default_fanout=_options.get('DEFAULT_FANOUT', 10),
+    fanout=_options.get('FANOUT'),
+    page_size=_options.get('DEFAULT_PAGE_SIZE', DEFAULT_PAGE_SIZE),
+)
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max, Min, Q
+
+from .response_cache import response_cache
+
+_options = getattr(settings, 'GRAPHQL_COUNTS', {})
+COUNT_CACHE = _options.get('CACHE', 'default')
+COUNT_TIMEOUT = _options.get('TIMEOUT', 30)
+SAMPLE_SIZE = _options.get('SAMPLE_SIZE', 10000)
+SAMPLE_RANGES = _options.get('SAMPLE_RANGES', 100)
+
+
+def table_count(model):
+    """Row count of ``model``'s table, cached for COUNT_TIMEOUT seconds.
+
+    The key carries the model's response-cache tag version, so the
+    mutations that invalidate cached responses also invalidate the count.
+    """
+    label = model._meta.label
+    version = response_cache.tag_versions([label])[label]
+    key = 'graphql:count:{}:{}'.format(label, version)
+    cache = caches[COUNT_CACHE]
+    count = cache.get(key)
+    if count is None:
+        count = model._default_manager.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def sample_window(model, total):
+    """Q over SAMPLE_RANGES primary-key ranges spread across the table.
+
+    The ranges are evenly strided between the lowest and highest key and
+    sized to hold about SAMPLE_SIZE rows between them, so the sample
+    covers old and new rows alike. Returns None when the primary key is
+    not an integer or the sample would cover the whole table.
+    """
+    bounds = model._default_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    low, high = bounds['low'], bounds['high']
+    if not isinstance(low, int) or not isinstance(high, int):
+        return None
+    span = high - low + 1
+    width = span * SAMPLE_SIZE // (total * SAMPLE_RANGES)
+    stride = span / SAMPLE_RANGES
+    if width < 1 or width >= stride:
+        return None
+    window = Q()
+    for i in range(SAMPLE_RANGES):
+        start = low + int(i * stride)
+        window |= Q(pk__gte=start, pk__lt=start + width)
+    return window
+
+
+def approximate_count(queryset):
+    """Estimate the size of a filtered queryset from a sample of the table.
+
+    Counts matches within sample_window() and scales by the share of the
+    table the window holds, so the cost is bounded by the sample.
+    """
+    model = queryset.model
+    total = table_count(model)
+    if total <= SAMPLE_SIZE:
+        return queryset.count()
+    window = sample_window(model, total)
+    if window is None:
+        return queryset.count()
+    sampled = model._default_manager.filter(window).count()
+    if not sampled:
+        return queryset.count()
+    matched = queryset.filter(window).count()
+    return round(matched * total / sampled)
+
+
+def count_queryset(queryset, approximate=False):
+    if not queryset.query.has_filters() and not queryset.query.distinct:
+        return table_count(queryset.model)
+    if approximate:
+        return approximate_count(queryset)
+    return queryset.count()
@@ -6,7 +6,7 @@ TIMESTAMP=$(date '+%Y-%m-%d %H:%M:%S')
 
 cd "$(dirname "$0")/../.."
 
-DELETED=$(python3 manage.py shell -c "import datetime; from crm.models import Customer, Order; cutoff = datetime.datetime.now() - datetime.timedelta(days=365); to_delete = Customer.objects.exclude(order__date__gte=cutoff).distinct(); count = to_delete.count(); to_delete.delete(); print(count)")
+DELETED=$(python3 manage.py shell -c "import datetime; from django.db.models import Q; from django.utils import timezone; from crm.models import Customer; cutoff = timezone.now() - datetime.timedelta(days=365); to_delete = Customer.objects.filter(Q(last_order_at__lt=cutoff) | Q(last_order_at__isnull=True)); count = to_delete.count(); to_delete.delete(); print(count)")
 
 if [ $? -eq 0 ]; then
     echo "$TIMESTAMP - Deleted $DELETED inactive customers" >> "$LOG_FILE"
@@ -0,0 +1,115 @@
+"""Per-customer order counters stored on Customer.
+
+``order_count``, ``lifetime_value`` and ``last_order_at`` let customer
+queries filter and sort by spend or activity without aggregating the
+orders. Order paths call ``add_orders`` in the transaction that creates
+the orders; order deletes call ``remove_orders`` before deleting (see
+crm.models.forget_orders). ``repair_customer_stats`` recomputes
+them from the orders.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Customer, Order
+from .response_cache import response_cache
+
+
+def add_orders(orders):
+    """Add newly created ``orders`` to their customers' counters.
+
+    One UPDATE adds each customer's new orders, read back by correlated
+    subqueries, with F() increments, so concurrent order paths do not lose
+    updates. Call inside the transaction that created the orders.
+    """
+    if not orders:
+        return
+    new = (
+        Order.objects.filter(pk__in=[order.pk for order in orders], customer=OuterRef('pk'))
+        .order_by()
+        .values('customer')
+    )
+    count = Subquery(new.annotate(count=Count('pk')).values('count'))
+    amount = Subquery(new.annotate(amount=Sum('total_amount')).values('amount'))
+    latest = Subquery(new.annotate(latest=Max('order_date')).values('latest'))
+    Customer.objects.filter(pk__in={order.customer_id for order in orders}).update(
+        order_count=F('order_count') + count,
+        lifetime_value=F('lifetime_value') + amount,
+        last_order_at=Greatest(Coalesce('last_order_at', latest), latest),
+    )
+    response_cache.invalidate_on_commit(Customer)
+
+
+def remove_orders(orders):
+    """Take ``orders``, about to be deleted, off their customers' counters.
+
+    Like add_orders, one UPDATE with correlated subqueries, however many
+    orders and customers there are. Call inside the deleting transaction,
+    before the delete.
+    """
+    doomed = Order.objects.filter(pk__in=orders.values('pk'))
+    removed = doomed.filter(customer=OuterRef('pk')).order_by().values('customer')
+    count = Subquery(removed.annotate(count=Count('pk')).values('count'))
+    amount = Subquery(removed.annotate(amount=Sum('total_amount')).values('amount'))
+    latest = (
+        Order.objects.filter(customer=OuterRef('pk'))
+        .exclude(pk__in=doomed.values('pk'))
+        .order_by('-order_date')
+        .values('order_date')[:1]
+    )
+    updated = Customer.objects.filter(pk__in=doomed.values('customer_id')).update(
+        order_count=F('order_count') - count,
+        lifetime_value=F('lifetime_value') - amount,
+        last_order_at=Subquery(latest),
+    )
+    if updated:
+        response_cache.invalidate_on_commit(Customer)
+
+
+def repair_customer_stats(batch_size=1000, dry_run=False):
+    """Recompute the counters of every customer from the orders, a batch at a time.
+
+    Only customers whose stored counters differ are written. Returns
+    ``(checked, repaired)``; with ``dry_run`` nothing is written.
+    """
+    checked = repaired = 0
+    last_pk = 0
+    while True:
+        # Locking the batch makes orders created meanwhile wait, so their
+        # increments land on the repaired values instead of being lost
+        with transaction.atomic():
+            customers = list(
+                Customer.objects.select_for_update()
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('order_count', 'lifetime_value', 'last_order_at')[:batch_size]
+            )
+            if not customers:
+                break
+            last_pk = customers[-1].pk
+            actual = {
+                row['customer_id']: row
+                for row in Order.objects.filter(customer_id__in=[customer.pk for customer in customers])
+                .values('customer_id')
+                .annotate(order_count=Count('pk'), lifetime_value=Sum('total_amount'), last_order_at=Max('order_date'))
+                .order_by()
+            }
+            stale = []
+            for customer in customers:
+                row = actual.get(customer.pk, {})
+                counters = (
+                    row.get('order_count', 0),
+                    row.get('lifetime_value') or Decimal('0'),
+                    row.get('last_order_at'),
+                )
+                if (customer.order_count, customer.lifetime_value, customer.last_order_at) != counters:
+                    customer.order_count, customer.lifetime_value, customer.last_order_at = counters
+                    stale.append(customer)
+            checked += len(customers)
+            repaired += len(stale)
+            if stale and not dry_run:
+                Customer.objects.bulk_update(stale, ['order_count', 'lifetime_value', 'last_order_at'])
+                response_cache.invalidate_on_commit(Customer)
+    return checked, repaired
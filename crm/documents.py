@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql import parse, print_schema
+from graphql.error import GraphQLError
+from graphql.validation import validate
+from graphene_django.settings import graphene_settings
+
+
+_schema_versions = weakref.WeakKeyDictionary()
+
+
+def schema_version(schema):
+    """Hash of the printed schema, computed once per schema object."""
+    version = _schema_versions.get(schema)
+    if version is None:
+        version = hashlib.sha256(print_schema(schema).encode()).hexdigest()
+        _schema_versions[schema] = version
+    return version
+
+
+class DocumentCache:
+    """Bounded LRU of parsed and validated GraphQL documents.
+
+    Entries are keyed by the sha256 of the query text, the schema version
+    and how the document was validated, and hold the document with its
+    validation errors, so a repeated query skips both ``parse`` and
+    ``validate``. A document that fails to parse is cached as
+    ``(None, [error])``. Trusted documents may be compiled with
+    ``validate=False``; their entries are never served to a validating
+    lookup.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, schema, query, validation_rules=None, validate=True):
+        digest = hashlib.sha256(query.encode()).hexdigest()
+        rules = tuple(validation_rules) if validate and validation_rules else None
+        return (digest, schema_version(schema), validate, rules)
+
+    def get(self, schema, query, validation_rules=None, validate=True):
+        key = self.key(schema, query, validation_rules, validate)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._compile(schema, query, validation_rules, validate)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _compile(self, schema, query, validation_rules, validate_document):
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        if not validate_document:
+            return document, []
+        errors = validate(
+            schema,
+            document,
+            validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        return document, errors
+
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+document_cache = DocumentCache(getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 512))
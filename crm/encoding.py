@@ -0,0 +1,52 @@
+"""Response encoders for the GraphQL view.
+
+orjson and msgpack are optional: without orjson responses fall back to the
+stdlib encoder, and without msgpack MessagePack is never negotiated.
+"""
+import datetime
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+MSGPACK_TYPES = (MSGPACK, 'application/msgpack', 'application/vnd.msgpack')
+
+
+def default(value):
+    # Decimals stay strings so no precision is lost, as the Decimal scalar does
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError('Object of type {} is not serializable'.format(type(value).__name__))
+
+
+def encode_json(data, pretty=False):
+    if orjson is None:
+        if pretty:
+            return json.dumps(data, sort_keys=True, indent=2, separators=(',', ': '), default=default)
+        return json.dumps(data, separators=(',', ':'), default=default)
+    option = orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+    return orjson.dumps(data, default=default, option=option)
+
+
+def encode_msgpack(data):
+    return msgpack.packb(data, default=default, use_bin_type=True)
+
+
+def encoders():
+    """Content types this process can answer with, preferred first."""
+    return (JSON,) + (MSGPACK_TYPES if msgpack is not None else ())
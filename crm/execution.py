@@ -0,0 +1,72 @@
+from asyncio import gather
+from functools import partial
+from inspect import isawaitable
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import ExecutionContext, execute
+from graphql.pyutils import Path, Undefined
+
+
+db_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRAPHQL_ASYNC_DB_WORKERS', 8),
+    thread_name_prefix='graphql-db',
+)
+
+
+def _run_in_worker(func, *args):
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_db_pool(func, *args):
+    """Run a blocking ORM call on the bounded database thread pool."""
+    return await sync_to_async(_run_in_worker, thread_sensitive=False, executor=db_executor)(func, *args)
+
+
+def map_in_db_pool(func, items):
+    """Call ``func`` on each item on the database thread pool, in order."""
+    return list(db_executor.map(partial(_run_in_worker, func), items))
+
+
+class ConcurrentExecutionContext(ExecutionContext):
+    """Resolves the root fields of a query concurrently.
+
+    Each root field, with everything below it, runs synchronously on the
+    database pool, so the ORM never runs on the event loop and sibling
+    root fields such as ``allCustomers`` and ``allOrders`` wait on the
+    database in parallel.
+    """
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        if path is not None:
+            return super().execute_fields(parent_type, source_value, path, fields)
+
+        async def execute_root_field(field_nodes, field_path):
+            result = await run_in_db_pool(
+                self.execute_field, parent_type, source_value, field_nodes, field_path
+            )
+            if self.is_awaitable(result):
+                result = await result
+            return result
+
+        async def get_results():
+            names = list(fields)
+            values = await gather(*(
+                execute_root_field(fields[name], Path(path, name, parent_type.name))
+                for name in names
+            ))
+            return {name: value for name, value in zip(names, values) if value is not Undefined}
+
+        return get_results()
+
+
+async def execute_concurrently(schema, document, **options):
+    result = execute(schema, document, execution_context_class=ConcurrentExecutionContext, **options)
+    if isawaitable(result):
+        result = await result
+    return result
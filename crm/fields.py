@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.db.models.query import QuerySet
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphene.types.argument import to_arguments
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+
+from .incremental import STREAM_BATCH_SIZE, stream_arguments
+from .optimizer import selected_fields
+from .pagination import StreamedEdges, is_keyset_cursor, keyset_connection, keyset_stream, ordering_keys
+
+_options = getattr(settings, 'GRAPHQL_CONNECTIONS', {})
+DEFAULT_PAGE_SIZE = _options.get('DEFAULT_PAGE_SIZE', 100)
+
+COUNT_ONLY_FIELDS = {'totalCount', '__typename'}
+
+
+def selects_count_only(info):
+    names = {
+        child.name.value
+        for node in info.field_nodes
+        if node.selection_set
+        for child in selected_fields(info.fragments, node.selection_set)
+    }
+    return names <= COUNT_ONLY_FIELDS
+
+
+def streams_edges(info):
+    return any(
+        child.name.value == 'edges' and stream_arguments(child, info.variable_values)
+        for node in info.field_nodes
+        if node.selection_set
+        for child in selected_fields(info.fragments, node.selection_set)
+    )
+
+
+class CRMConnectionField(DjangoFilterConnectionField):
+    """Filter connection with keyset pagination and per-page batching.
+
+    Pages are fetched by seeking on the ordering keys encoded in the
+    cursor instead of LIMIT/OFFSET, so deep pages cost the same as the
+    first. ``offset``, legacy offset cursors and orderings that cannot be
+    seeked fall back to the upstream slicing.
+
+    When only ``totalCount`` is selected no rows are fetched at all. When
+    ``edges`` is under ``@stream``, a forward keyset page is read lazily in
+    batches (see keyset_stream).
+
+    Without ``first`` or ``last`` a page holds DEFAULT_PAGE_SIZE edges;
+    RELAY_CONNECTION_MAX_LIMIT only caps what they may ask for.
+
+    ``order_by`` is exposed as an argument and passed to the resolver.
+
+    Node types may define ``prepare_batch(info, nodes)`` to queue the page
+    on the request's loaders before the nested fields are resolved.
+    """
+
+    def __init__(self, type_, *args, order_by=None, **kwargs):
+        super().__init__(type_, *args, **kwargs)
+        if order_by is not None:
+            self.args = to_arguments(self._base_args, {'order_by': order_by})
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        if args.get('first') is None and args.get('last') is None:
+            args['first'] = min(DEFAULT_PAGE_SIZE, max_limit or DEFAULT_PAGE_SIZE)
+        if streams_edges(info):
+            args['stream'] = True
+        if not selects_count_only(info):
+            return super().connection_resolver(
+                resolver,
+                connection,
+                default_manager,
+                queryset_resolver,
+                max_limit,
+                enforce_first_or_last,
+                root,
+                info,
+                **args,
+            )
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        iterable = queryset_resolver(connection, iterable, info, args)
+        page = connection_adapter(connection, [], page_info_adapter(None, None, False, False))
+        page.iterable = maybe_queryset(iterable)
+        return page
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        iterable = maybe_queryset(iterable)
+        keys = ordering_keys(iterable) if isinstance(iterable, QuerySet) else None
+        if (
+            keys is None
+            or args.get('offset')
+            or not is_keyset_cursor(args.get('after'))
+            or not is_keyset_cursor(args.get('before'))
+        ):
+            return super().resolve_connection(connection, args, iterable, max_limit)
+
+        if args.get('stream') and args.get('first') is not None and args.get('last') is None:
+            page = keyset_stream(connection, iterable, keys, args, STREAM_BATCH_SIZE)
+        else:
+            page = keyset_connection(connection, iterable, keys, args)
+        page.iterable = iterable
+        return page
+
+    def wrap_resolve(self, parent_resolver):
+        resolve = super().wrap_resolve(parent_resolver)
+        prepare_batch = getattr(self.node_type, 'prepare_batch', None)
+        if prepare_batch is None:
+            return resolve
+
+        def resolve_and_prepare(root, info, **args):
+            connection = resolve(root, info, **args)
+            if isinstance(connection.edges, StreamedEdges):
+                connection.edges.on_batch = lambda edges: prepare_batch(info, [edge.node for edge in edges])
+            else:
+                prepare_batch(info, [edge.node for edge in connection.edges])
+            return connection
+
+        return resolve_and_prepare
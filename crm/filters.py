@@ -1,23 +1,48 @@
 import django_filters
+import graphene
+from graphene_django.filter import ListFilter
 from .models import Customer, Product, Order
-from django.db.models import Q
+from django.db.models import Count, Exists, OuterRef, Q
+from .search import filter_contains
+from .phones import normalize_phone, prefix_range
 
 class CustomerFilter(django_filters.FilterSet):
-    name_icontains = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
-    email_icontains = django_filters.CharFilter(field_name='email', lookup_expr='icontains')
+    name_icontains = django_filters.CharFilter(field_name='name', method='filter_contains')
+    email_icontains = django_filters.CharFilter(field_name='email', method='filter_contains')
     created_at_gte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
     created_at_lte = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='lte')
     phone_pattern = django_filters.CharFilter(method='filter_phone_pattern')
+    order_count_gte = django_filters.NumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count_lte = django_filters.NumberFilter(field_name='order_count', lookup_expr='lte')
+    lifetime_value_gte = django_filters.NumberFilter(field_name='lifetime_value', lookup_expr='gte')
+    lifetime_value_lte = django_filters.NumberFilter(field_name='lifetime_value', lookup_expr='lte')
+    last_order_at_gte = django_filters.DateTimeFilter(field_name='last_order_at', lookup_expr='gte')
+    last_order_at_lte = django_filters.DateTimeFilter(field_name='last_order_at', lookup_expr='lte')
+    inactive_since = django_filters.DateTimeFilter(method='filter_inactive_since')
 
     class Meta:
         model = Customer
-        fields = ['name_icontains', 'email_icontains', 'created_at_gte', 'created_at_lte', 'phone_pattern']
+        fields = ['name_icontains', 'email_icontains', 'created_at_gte', 'created_at_lte', 'phone_pattern',
+                  'order_count_gte', 'order_count_lte', 'lifetime_value_gte', 'lifetime_value_lte',
+                  'last_order_at_gte', 'last_order_at_lte', 'inactive_since']
+
+    def filter_contains(self, queryset, name, value):
+        # Served by the full-text index where there is one
+        return filter_contains(queryset, name, value)
 
     def filter_phone_pattern(self, queryset, name, value):
-        return queryset.filter(phone__startswith=value)
+        # Input and column normalized alike, so formatting does not matter
+        prefix = normalize_phone(value)
+        if prefix is None:
+            return queryset.none()
+        return queryset.filter(**prefix_range(prefix))
+
+    def filter_inactive_since(self, queryset, name, value):
+        # Customers who never ordered count as inactive too
+        return queryset.filter(Q(last_order_at__lt=value) | Q(last_order_at__isnull=True))
 
 class ProductFilter(django_filters.FilterSet):
-    name_icontains = django_filters.CharFilter(field_name='name', lookup_expr='icontains')
+    name_icontains = django_filters.CharFilter(field_name='name', method='filter_contains')
     price_gte = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
     price_lte = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
     stock_gte = django_filters.NumberFilter(field_name='stock', lookup_expr='gte')
@@ -27,6 +52,9 @@ class ProductFilter(django_filters.FilterSet):
         model = Product
         fields = ['name_icontains', 'price_gte', 'price_lte', 'stock_gte', 'stock_lte']
 
+    def filter_contains(self, queryset, name, value):
+        return filter_contains(queryset, name, value)
+
 class OrderFilter(django_filters.FilterSet):
     total_amount_gte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='gte')
     total_amount_lte = django_filters.NumberFilter(field_name='total_amount', lookup_expr='lte')
@@ -35,13 +63,50 @@ class OrderFilter(django_filters.FilterSet):
     customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
     product_name = django_filters.CharFilter(method='filter_product_name')
     product_id = django_filters.NumberFilter(method='filter_product_id')
+    product_ids_any = ListFilter(input_type=graphene.List(graphene.ID), method='filter_product_ids_any')
+    product_ids_all = ListFilter(input_type=graphene.List(graphene.ID), method='filter_product_ids_all')
 
     class Meta:
         model = Order
-        fields = ['total_amount_gte', 'total_amount_lte', 'order_date_gte', 'order_date_lte', 'customer_name', 'product_name', 'product_id']
+        fields = ['total_amount_gte', 'total_amount_lte', 'order_date_gte', 'order_date_lte', 'customer_name', 'product_name', 'product_id',
+                  'product_ids_any', 'product_ids_all']
+
+    # Product filters test the order's lines with EXISTS or IN subqueries
+    # rather than joining them, so each order appears once and counts and
+    # pages stay right. An empty or invalid productIdsAny/productIdsAll
+    # list matches no orders, as graphene-django's list filters do.
+    def order_lines(self):
+        return Order.products.through.objects.filter(order_id=OuterRef('pk'))
+
+    def product_ids(self, values):
+        try:
+            return {int(value) for value in values}
+        except (TypeError, ValueError):
+            return None
 
     def filter_product_name(self, queryset, name, value):
-        return queryset.filter(products__name__icontains=value)
+        products = filter_contains(Product.objects.all(), 'name', value)
+        return queryset.filter(Exists(self.order_lines().filter(product_id__in=products.values('pk'))))
 
     def filter_product_id(self, queryset, name, value):
-        return queryset.filter(products__id=value)
+        return queryset.filter(Exists(self.order_lines().filter(product_id=value)))
+
+    def filter_product_ids_any(self, queryset, name, value):
+        ids = self.product_ids(value)
+        if not ids:
+            return queryset.none()
+        return queryset.filter(Exists(self.order_lines().filter(product_id__in=ids)))
+
+    def filter_product_ids_all(self, queryset, name, value):
+        ids = self.product_ids(value)
+        if not ids:
+            return queryset.none()
+        # One grouped subquery however many products are asked for
+        orders = (
+            Order.products.through.objects.filter(product_id__in=ids)
+            .values('order_id')
+            .annotate(matched=Count('product_id'))
+            .filter(matched=len(ids))
+            .values('order_id')
+        )
+        return queryset.filter(pk__in=orders)
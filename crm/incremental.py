@@ -0,0 +1,294 @@
+"""@defer and @stream for queries, delivered as an incremental response.
+
+graphql-core 3.2 has no incremental delivery, so IncrementalExecutionContext
+implements it on top of the regular executor: deferred fragments and the
+items of streamed lists past ``initialCount`` are set aside while the
+initial payload is built, then completed as later payloads.
+Payloads follow the 2022-08-24 draft of the spec (``incremental`` lists
+with ``hasNext``), as Apollo Client and urql expect.
+"""
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+from graphql import (
+    DirectiveLocation,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLDirective,
+    GraphQLError,
+    GraphQLInt,
+    GraphQLNonNull,
+    GraphQLString,
+    InlineFragmentNode,
+    located_error,
+    specified_directives,
+)
+from graphql.execution.collect_fields import (
+    does_fragment_condition_match,
+    get_field_entry_key,
+    should_include_node,
+)
+from graphql.execution.execute import CollectedErrors, ExecutionContext, invalid_return_type_error
+from graphql.execution.values import get_directive_values
+from graphql.language import BREAK, Visitor, visit
+from graphql.pyutils import is_iterable
+
+_options = getattr(settings, 'GRAPHQL_INCREMENTAL', {})
+STREAM_BATCH_SIZE = _options.get('STREAM_BATCH_SIZE', 100)
+
+DeferDirective = GraphQLDirective(
+    name='defer',
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+    },
+    description='Deliver the fragment in a later payload of an incremental response.',
+)
+
+StreamDirective = GraphQLDirective(
+    name='stream',
+    locations=[DirectiveLocation.FIELD],
+    args={
+        'if': GraphQLArgument(GraphQLNonNull(GraphQLBoolean), default_value=True),
+        'label': GraphQLArgument(GraphQLString),
+        'initialCount': GraphQLArgument(GraphQLNonNull(GraphQLInt), default_value=0),
+    },
+    description='Deliver the list items past initialCount in later payloads of an incremental response.',
+)
+
+directives = specified_directives + (DeferDirective, StreamDirective)
+
+
+class _IncrementalDirectiveFinder(Visitor):
+    found = False
+
+    def enter_directive(self, node, *_args):
+        if node.name.value in (DeferDirective.name, StreamDirective.name):
+            self.found = True
+            return BREAK
+
+
+def has_incremental_directives(document):
+    finder = _IncrementalDirectiveFinder()
+    visit(document, finder)
+    return finder.found
+
+
+def stream_arguments(field_node, variable_values):
+    """The @stream arguments of ``field_node``, or None if it is not streamed."""
+    values = get_directive_values(StreamDirective, field_node, variable_values)
+    if values and values['if']:
+        return values
+    return None
+
+
+class DeferredFragment:
+    def __init__(self, label, parent_type, source, path, selection_set):
+        self.label = label
+        self.parent_type = parent_type
+        self.source = source
+        self.path = path
+        self.selection_set = selection_set
+
+    def payloads(self, context):
+        context.collected_errors = CollectedErrors()
+        fields = context.collect_deferrable(self.parent_type, [self.selection_set], self.source, self.path)
+        try:
+            data = context.execute_fields(self.parent_type, self.source, self.path, fields)
+        except GraphQLError as error:
+            context.collected_errors.add(error, self.path)
+            data = None
+        yield context.patch({'data': data}, self.path.as_list() if self.path else [], self.label)
+
+
+class StreamedList:
+    def __init__(self, label, item_type, field_nodes, info, path, items, start):
+        self.label = label
+        self.item_type = item_type
+        self.field_nodes = field_nodes
+        self.info = info
+        self.path = path
+        self.items = items
+        self.start = start
+
+    def payloads(self, context):
+        index = self.start
+        while True:
+            # Only one batch of items is held at a time
+            batch = list(islice(self.items, context.stream_batch_size))
+            if not batch:
+                return
+            context.collected_errors = CollectedErrors()
+            completed = []
+            try:
+                for offset, item in enumerate(batch):
+                    item_path = self.path.add_key(index + offset, None)
+                    try:
+                        completed.append(context.complete_value(
+                            self.item_type, self.field_nodes, self.info, item_path, item
+                        ))
+                    except Exception as raw_error:
+                        error = located_error(raw_error, self.field_nodes, item_path.as_list())
+                        context.handle_field_error(error, self.item_type, item_path)
+                        completed.append(None)
+            except GraphQLError as error:
+                # A non-null item failed: the stream ends here
+                context.collected_errors.add(error, self.path)
+                yield context.patch({'items': None}, self.path.as_list() + [index], self.label)
+                return
+            yield context.patch({'items': completed}, self.path.as_list() + [index], self.label)
+            index += len(batch)
+
+
+class IncrementalExecutionContext(ExecutionContext):
+    """Execution context that sets deferred fragments and streamed items aside."""
+
+    stream_batch_size = STREAM_BATCH_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = deque()
+
+    def execute_operation(self, operation, root_value):
+        root_type = self.schema.get_root_type(operation.operation)
+        if root_type is None:
+            return super().execute_operation(operation, root_value)
+        fields = self.collect_deferrable(root_type, [operation.selection_set], root_value, None)
+        return self.execute_fields(root_type, root_value, None, fields)
+
+    def complete_object_value(self, return_type, field_nodes, info, path, result):
+        if return_type.is_type_of and not return_type.is_type_of(result, info):
+            raise invalid_return_type_error(return_type, result, field_nodes)
+        selection_sets = [node.selection_set for node in field_nodes if node.selection_set]
+        fields = self.collect_deferrable(return_type, selection_sets, result, path)
+        return self.execute_fields(return_type, result, path, fields)
+
+    def complete_list_value(self, return_type, field_nodes, info, path, result):
+        stream = stream_arguments(field_nodes[0], self.variable_values)
+        if stream is None or not is_iterable(result):
+            return super().complete_list_value(return_type, field_nodes, info, path, result)
+        items = iter(result)
+        initial = list(islice(items, stream['initialCount']))
+        # Completing the initial items first queues their @defer fragments
+        # ahead of the rest of the stream
+        completed = super().complete_list_value(return_type, field_nodes, info, path, initial)
+        self.pending.append(StreamedList(
+            stream.get('label'), return_type.of_type, field_nodes, info, path, items, len(initial)
+        ))
+        return completed
+
+    def collect_deferrable(self, runtime_type, selection_sets, source, path):
+        """Collect fields as collect_fields does, setting @defer fragments aside."""
+        fields = {}
+        visited_fragment_names = set()
+        for selection_set in selection_sets:
+            self._collect(runtime_type, selection_set, source, path, fields, visited_fragment_names)
+        return fields
+
+    def _collect(self, runtime_type, selection_set, source, path, fields, visited_fragment_names):
+        for selection in selection_set.selections:
+            if not should_include_node(self.variable_values, selection):
+                continue
+            if isinstance(selection, FieldNode):
+                fields.setdefault(get_field_entry_key(selection), []).append(selection)
+                continue
+            if isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                if name in visited_fragment_names:
+                    continue
+                visited_fragment_names.add(name)
+                fragment = self.fragments.get(name)
+                if fragment is None:
+                    continue
+            else:
+                continue
+            if not does_fragment_condition_match(self.schema, fragment, runtime_type):
+                continue
+            defer = get_directive_values(DeferDirective, selection, self.variable_values)
+            if defer and defer['if']:
+                self.pending.append(DeferredFragment(
+                    defer.get('label'), runtime_type, source, path, fragment.selection_set
+                ))
+            else:
+                self._collect(
+                    runtime_type, fragment.selection_set, source, path, fields, visited_fragment_names
+                )
+
+    def patch(self, patch, path, label):
+        patch['path'] = path
+        if label is not None:
+            patch['label'] = label
+        if self.collected_errors.errors:
+            patch['errors'] = self.collected_errors.errors
+        return patch
+
+
+def execute_incremental(
+    schema,
+    document,
+    root_value=None,
+    context_value=None,
+    variable_values=None,
+    operation_name=None,
+    middleware=None,
+):
+    """Execute a query, yielding the payloads of an incremental response.
+
+    The first payload has the ``data`` that does not depend on deferred
+    fragments or streamed items, the later ones an ``incremental`` list
+    of patches; every payload has ``hasNext``. Payloads are produced as
+    they are consumed. Errors are left as GraphQLError instances.
+    """
+    context = IncrementalExecutionContext.build(
+        schema, document, root_value, context_value, variable_values, operation_name,
+        middleware=middleware,
+    )
+    if isinstance(context, list):
+        yield {'errors': context, 'hasNext': False}
+        return
+
+    try:
+        data = context.execute_operation(context.operation, root_value)
+    except GraphQLError as error:
+        context.collected_errors.add(error, None)
+        data = None
+    initial = {'data': data}
+    if context.collected_errors.errors:
+        initial['errors'] = context.collected_errors.errors
+    initial['hasNext'] = bool(context.pending)
+    yield initial
+
+    if not context.pending:
+        return
+    patches = []
+    for patch in iter_patches(context, context.pending):
+        patches.append(patch)
+        # Deferred fragments, often one per list item, are sent in groups
+        if 'items' in patch or len(patches) >= context.stream_batch_size:
+            yield {'incremental': patches, 'hasNext': True}
+            patches = []
+    if patches:
+        yield {'incremental': patches, 'hasNext': False}
+    else:
+        yield {'hasNext': False}
+
+
+def iter_patches(context, records):
+    """Yield the patches of ``records``, depth first.
+
+    Records queued while a patch was completed go out right after it, so a
+    streamed batch and the rows it holds are released before the next.
+    """
+    for record in records:
+        context.pending = deque()
+        for patch in record.payloads(context):
+            queued = context.pending
+            yield patch
+            yield from iter_patches(context, queued)
+            context.pending = deque()
@@ -0,0 +1,95 @@
+import threading
+from collections import defaultdict
+
+from .models import Customer, Order
+
+
+class DataLoader:
+    """Per-request batching loader.
+
+    Resolvers call ``load(key)``. Keys queued with ``prepare`` are fetched
+    together with the first key that misses the cache, so a whole page of
+    nodes costs one query instead of one per node. Root fields may resolve
+    in parallel threads, so access is serialized.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._pending = set()
+        self._lock = threading.RLock()
+
+    def batch_load(self, keys):
+        """Return a dict mapping each found key to its value."""
+        raise NotImplementedError
+
+    def default(self, key):
+        return None
+
+    def prepare(self, keys):
+        with self._lock:
+            self._pending.update(key for key in keys if key not in self._cache)
+
+    def prime(self, key, value):
+        with self._lock:
+            self._cache.setdefault(key, value)
+            self._pending.discard(key)
+
+    def load(self, key):
+        with self._lock:
+            if key not in self._cache:
+                self._pending.add(key)
+                keys = list(self._pending)
+                self._pending.clear()
+                found = self.batch_load(keys)
+                for k in keys:
+                    self._cache[k] = found.get(k, self.default(k))
+            return self._cache[key]
+
+
+class CustomerLoader(DataLoader):
+    def batch_load(self, keys):
+        return Customer.objects.in_bulk(keys)
+
+
+class OrderProductsLoader(DataLoader):
+    def batch_load(self, keys):
+        products = defaultdict(list)
+        rows = (
+            Order.products.through.objects
+            .filter(order_id__in=keys)
+            .select_related('product')
+            .order_by('id')
+        )
+        for row in rows:
+            products[row.order_id].append(row.product)
+        return products
+
+    def default(self, key):
+        return []
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of one request."""
+
+    def __init__(self):
+        self.customer = CustomerLoader()
+        self.order_products = OrderProductsLoader()
+
+    def prepare_orders(self, orders):
+        # Skip relations the optimizer already joined or prefetched, and
+        # foreign keys it deferred because the customer was not selected.
+        for order in orders:
+            if not Order.customer.is_cached(order) and 'customer_id' not in order.get_deferred_fields():
+                self.customer.prepare([order.customer_id])
+            if 'products' not in getattr(order, '_prefetched_objects_cache', {}):
+                self.order_products.prepare([order.pk])
+
+
+def get_loaders(info):
+    context = info.context
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        if context is not None:
+            context.loaders = loaders
+    return loaders
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from crm.phones import backfill_phone_digits
+
+
+class Command(BaseCommand):
+    help = "Fill the normalized phone digits of existing customers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Customers updated per query (default 1000).")
+
+    def handle(self, *args, batch_size, **options):
+        updated = backfill_phone_digits(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} customers."))
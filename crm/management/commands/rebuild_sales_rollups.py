@@ -0,0 +1,27 @@
+import argparse
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.rollups import rebuild_rollups
+
+
+def parse_day(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value} (expected YYYY-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from the orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=parse_day, help="First day to rebuild (YYYY-MM-DD); defaults to the first order.")
+        parser.add_argument("--end", type=parse_day, help="Last day to rebuild (YYYY-MM-DD); defaults to the last order.")
+
+    def handle(self, *args, start=None, end=None, **options):
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end.")
+        days = rebuild_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups for {days} days."))
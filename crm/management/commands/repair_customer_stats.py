@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from crm.customer_stats import repair_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Check the per-customer order counters against the orders and repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Customers checked per query (default 1000).")
+        parser.add_argument("--dry-run", action="store_true", help="Report stale counters without writing them.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        checked, repaired = repair_customer_stats(batch_size=batch_size, dry_run=dry_run)
+        verb = "would be repaired" if dry_run else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} customers; {repaired} {verb}."))
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# Trigram FTS5 tables mirroring the searchable columns (see crm.search).
+# They are external-content tables: the text stays in crm_customer and
+# crm_product, the triggers keep the index in step with every write.
+FORWARD = [
+    """CREATE VIRTUAL TABLE crm_customer_search USING fts5(
+        name, email, content='crm_customer', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER crm_customer_search_insert AFTER INSERT ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END""",
+    """CREATE TRIGGER crm_customer_search_delete AFTER DELETE ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(crm_customer_search, rowid, name, email)
+        VALUES ('delete', old.id, old.name, old.email);
+    END""",
+    """CREATE TRIGGER crm_customer_search_update AFTER UPDATE OF name, email ON crm_customer BEGIN
+        INSERT INTO crm_customer_search(crm_customer_search, rowid, name, email)
+        VALUES ('delete', old.id, old.name, old.email);
+        INSERT INTO crm_customer_search(rowid, name, email) VALUES (new.id, new.name, new.email);
+    END""",
+    "INSERT INTO crm_customer_search(crm_customer_search) VALUES ('rebuild')",
+    """CREATE VIRTUAL TABLE crm_product_search USING fts5(
+        name, content='crm_product', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER crm_product_search_insert AFTER INSERT ON crm_product BEGIN
+        INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER crm_product_search_delete AFTER DELETE ON crm_product BEGIN
+        INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER crm_product_search_update AFTER UPDATE OF name ON crm_product BEGIN
+        INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO crm_product_search(crm_product_search) VALUES ('rebuild')",
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS crm_customer_search_insert",
+    "DROP TRIGGER IF EXISTS crm_customer_search_delete",
+    "DROP TRIGGER IF EXISTS crm_customer_search_update",
+    "DROP TABLE IF EXISTS crm_customer_search",
+    "DROP TRIGGER IF EXISTS crm_product_search_insert",
+    "DROP TRIGGER IF EXISTS crm_product_search_delete",
+    "DROP TRIGGER IF EXISTS crm_product_search_update",
+    "DROP TABLE IF EXISTS crm_product_search",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # Other databases, and SQLite before 3.34 (no trigram tokenizer),
+        # keep the LIKE-based filters
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite' or connection.Database.sqlite_version_info < (3, 34):
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
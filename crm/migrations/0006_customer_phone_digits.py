@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_search_index'),
+    ]
+
+    # Existing rows are filled by 0010_backfill_phone_digits
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+# The order-products table is Django's auto-created through table, which
+# cannot declare Meta.indexes; the index is managed here instead.
+INDEX = models.Index(fields=['product', 'order'], name='crm_order_products_prod_idx')
+
+
+def add_index(apps, schema_editor):
+    through = apps.get_model('crm', 'Order').products.through
+    schema_editor.add_index(through, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    through = apps.get_model('crm', 'Order').products.through
+    schema_editor.remove_index(through, INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_customer_phone_digits'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
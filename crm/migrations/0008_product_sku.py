@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+# Adding a unique column makes SQLite rebuild crm_product, which drops the
+# search triggers of 0005; they are recreated and the index rebuilt from
+# the table, as 0005 did.
+PRODUCT_SEARCH = [
+    "DROP TRIGGER IF EXISTS crm_product_search_insert",
+    "DROP TRIGGER IF EXISTS crm_product_search_delete",
+    "DROP TRIGGER IF EXISTS crm_product_search_update",
+    """CREATE TRIGGER crm_product_search_insert AFTER INSERT ON crm_product BEGIN
+        INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER crm_product_search_delete AFTER DELETE ON crm_product BEGIN
+        INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER crm_product_search_update AFTER UPDATE OF name ON crm_product BEGIN
+        INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+    END""",
+    "INSERT INTO crm_product_search(crm_product_search) VALUES ('rebuild')",
+]
+
+
+def restore_product_search(apps, schema_editor):
+    # Only where 0005 created the search table
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'crm_product_search' not in connection.introspection.table_names(cursor):
+            return
+    for statement in PRODUCT_SEARCH:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_order_products_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(restore_product_search, migrations.RunPython.noop),
+    ]
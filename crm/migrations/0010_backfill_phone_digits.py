@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def backfill_phone_digits(apps, schema_editor):
+    from crm.phones import backfill_phone_digits
+
+    backfill_phone_digits(model=apps.get_model('crm', 'Customer'))
+
+
+class Migration(migrations.Migration):
+    # Customer.save() keeps phone_digits up to date from here on; this
+    # fills the customers saved before it did
+
+    dependencies = [
+        ('crm', '0009_order_date_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_phone_digits, migrations.RunPython.noop),
+    ]
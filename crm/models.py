@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -7,26 +8,114 @@ class Customer(models.Model):
     nickname = models.CharField(max_length=100, blank=True, null=True)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
+    # E.164 digits of phone, for prefix lookups (see crm.phones)
+    phone_digits = models.CharField(max_length=20, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Maintained from the orders by crm.customer_stats
+    order_count = models.PositiveIntegerField(default=0, db_index=True)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), db_index=True)
+    last_order_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        # The id column lets keyset pagination seek on the same index
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='crm_customer_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # phone_digits follows phone on every save; bulk paths set it themselves
+        from .phones import normalize_phone
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            if 'phone' not in self.get_deferred_fields():
+                self.phone_digits = normalize_phone(self.phone)
+        elif 'phone' in update_fields:
+            self.phone_digits = normalize_phone(self.phone)
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        super().save(*args, **kwargs)
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
+    # Natural key for catalog syncs (upsertProducts)
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='crm_product_price_idx'),
+            models.Index(fields=['stock', 'id'], name='crm_product_stock_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+def forget_orders(orders):
+    """Take ``orders``, about to be deleted, off the customer counters and
+    daily rollups, and drop the cached responses that read them.
+
+    Done in the delete paths rather than from a post_delete signal, which
+    would cost queries per order and disable fast deletes.
+    """
+    from .customer_stats import remove_orders
+    from .response_cache import response_cache
+    from .rollups import subtract_orders
+
+    remove_orders(orders)
+    subtract_orders(orders)
+    response_cache.invalidate_on_commit(Order)
+
+
+class OrderQuerySet(models.QuerySet):
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            forget_orders(self)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Order(models.Model):
     id = models.AutoField(primary_key=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     products = models.ManyToManyField(Product, related_name='orders')
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
-    order_date = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so imported orders keep their dates
+    order_date = models.DateTimeField(default=timezone.now)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='crm_order_date_idx'),
+            models.Index(fields=['total_amount', 'id'], name='crm_order_total_idx'),
+            # A customer's orders by date, and the daily distinct-customer check
+            models.Index(fields=['customer', 'order_date'], name='crm_order_customer_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.customer.name}"
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(Order, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            forget_orders(Order.objects.using(using).filter(pk=self.pk))
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class DailySalesRollup(models.Model):
+    """Sales totals of one day, kept up to date as orders are created."""
+    day = models.DateField(primary_key=True)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    customer_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sales on {self.day}"
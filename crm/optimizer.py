@@ -0,0 +1,94 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def selected_fields(fragments, selection_set):
+    """Yield the field nodes of a selection set, expanding fragments."""
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from selected_fields(fragments, selection.selection_set)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments[selection.name.value]
+            yield from selected_fields(fragments, fragment.selection_set)
+
+
+def child_fields(info, field_nodes, name):
+    """Return every node selecting ``name`` under ``field_nodes``.
+
+    Matching is on the field name, so aliased copies of a field are merged.
+    """
+    return [
+        child
+        for node in field_nodes
+        if node.selection_set
+        for child in selected_fields(info.fragments, node.selection_set)
+        if child.name.value == name
+    ]
+
+
+def connection_node_fields(info):
+    return child_fields(info, child_fields(info, info.field_nodes, 'edges'), 'node')
+
+
+def optimize_queryset(queryset, info, field_nodes=None, required=()):
+    """Add select_related/prefetch_related/only() for the requested fields.
+
+    ``field_nodes`` defaults to the ``edges { node }`` selection of the
+    connection being resolved. ``required`` names columns that must stay
+    loaded whatever the selection.
+    """
+    if field_nodes is None:
+        field_nodes = connection_node_fields(info)
+    if not field_nodes:
+        return queryset
+    only, select, prefetch = list(required), [], []
+    if _plan(info, queryset.model, field_nodes, '', only, select, prefetch):
+        queryset = queryset.only(*only)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def _plan(info, model, field_nodes, prefix, only, select, prefetch):
+    """Collect the lookups for one model level.
+
+    Returns False when a selected field is not backed by a model field, in
+    which case the columns of that level are left undeferred.
+    """
+    can_defer = True
+    only.append(prefix + model._meta.pk.name)
+    names = []
+    for node in field_nodes:
+        for child in selected_fields(info.fragments, node.selection_set):
+            name = child.name.value
+            if name not in names:
+                names.append(name)
+    for name in names:
+        if name == '__typename':
+            continue
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            can_defer = False
+            continue
+        lookup = prefix + field.name
+        children = child_fields(info, field_nodes, name)
+        if field.many_to_many or field.one_to_many:
+            related = field.related_model._default_manager.all()
+            required = (field.field.name,) if field.one_to_many else ()
+            related = optimize_queryset(related, info, children, required)
+            prefetch.append(Prefetch(lookup, queryset=related))
+        elif field.is_relation:
+            only.append(lookup)
+            select.append(lookup)
+            if not _plan(info, field.related_model, children, lookup + '__', only, select, prefetch):
+                can_defer = False
+        else:
+            only.append(lookup)
+    return can_defer
@@ -0,0 +1,197 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphql import GraphQLError
+
+CURSOR_PREFIX = 'keyset:'
+
+
+def is_keyset_cursor(cursor):
+    return not cursor or cursor.startswith(CURSOR_PREFIX)
+
+
+def ordering_keys(queryset):
+    """Return the ordering of ``queryset`` as ``[(field, descending)]``.
+
+    The primary key is appended as a tie-breaker. Returns None when the
+    ordering cannot be expressed as a seek (random, expressions, related
+    lookups or non-concrete fields).
+    """
+    opts = queryset.model._meta
+    ordering = list(queryset.query.order_by)
+    if not ordering and queryset.query.default_ordering:
+        ordering = list(opts.ordering)
+    keys = []
+    for item in ordering:
+        if not isinstance(item, str) or item == '?':
+            return None
+        descending = item.startswith('-')
+        name = item.lstrip('-+')
+        if name == 'pk':
+            name = opts.pk.name
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many or field.null:
+            return None
+        keys.append((field, descending))
+    if not any(field.primary_key for field, _ in keys):
+        keys.append((opts.pk, keys[-1][1] if keys else False))
+    return keys
+
+
+def load_keys(queryset, keys):
+    """Make sure ``queryset`` loads the ordering keys with its rows.
+
+    The optimizer restricts columns with ``only()`` to what the query
+    selects; a key left deferred would cost a query per cursor.
+    """
+    key_names = {field.name for field, _ in keys}
+    names, defer = queryset.query.deferred_loading
+    if defer and names & key_names:
+        return queryset.defer(None).defer(*(names - key_names))
+    if not defer and not key_names <= names:
+        return queryset.only(*names, *key_names)
+    return queryset
+
+
+def encode_cursor(node, keys):
+    values = [field.value_from_object(node) for field, _ in keys]
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return CURSOR_PREFIX + base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    try:
+        payload = base64.urlsafe_b64decode(cursor[len(CURSOR_PREFIX):].encode())
+        values = json.loads(payload)
+        if len(values) != len(keys):
+            raise ValueError
+        return [field.to_python(value) for (field, _), value in zip(keys, values)]
+    except Exception:
+        raise GraphQLError('Invalid cursor "{}".'.format(cursor))
+
+
+def seek(keys, values, forward):
+    """Q selecting the rows strictly after (or before) ``values``.
+
+    Expands ``(k1, k2, ...) > (v1, v2, ...)`` into
+    ``k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...`` so each key may have its
+    own direction, and adds ``k1 >= v1`` so the leading index column can
+    drive a range scan.
+    """
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        lookup = 'gt' if forward != descending else 'lt'
+        condition |= equal & Q(**{'{}__{}'.format(field.attname, lookup): value})
+        equal &= Q(**{field.attname: value})
+    first_field, first_descending = keys[0]
+    bound = 'gte' if forward != first_descending else 'lte'
+    return Q(**{'{}__{}'.format(first_field.attname, bound): values[0]}) & condition
+
+
+def keyset_connection(connection_type, queryset, keys, args):
+    """Build a connection page by seeking on the ordering keys.
+
+    Page cost depends on the page size, not on how deep the cursor is.
+    """
+    first, last = args.get('first'), args.get('last')
+    after, before = args.get('after'), args.get('before')
+    queryset = queryset.order_by(*[('-' if desc else '') + field.attname for field, desc in keys])
+    queryset = load_keys(queryset, keys)
+
+    if after:
+        queryset = queryset.filter(seek(keys, decode_cursor(after, keys), forward=True))
+    if before:
+        queryset = queryset.filter(seek(keys, decode_cursor(before, keys), forward=False))
+
+    has_previous_page = bool(after)
+    has_next_page = bool(before)
+    if first is not None:
+        nodes = list(queryset[:first + 1])
+        has_next_page = len(nodes) > first
+        nodes = nodes[:first]
+        if last is not None and len(nodes) > last:
+            nodes = nodes[-last:]
+            has_previous_page = True
+    elif last is not None:
+        nodes = list(queryset.reverse()[:last + 1])
+        has_previous_page = len(nodes) > last
+        nodes = nodes[:last][::-1]
+    else:
+        nodes = list(queryset)
+
+    edges = [connection_type.Edge(node=node, cursor=encode_cursor(node, keys)) for node in nodes]
+    page_info = page_info_adapter(
+        edges[0].cursor if edges else None,
+        edges[-1].cursor if edges else None,
+        has_previous_page,
+        has_next_page,
+    )
+    return connection_adapter(connection_type, edges, page_info)
+
+
+class StreamedEdges:
+    """The edges of a page, fetched lazily one batch of rows at a time.
+
+    ``on_batch(edges)`` is called with each batch before its edges are
+    yielded, so the batch can be queued on the request's loaders.
+    """
+
+    def __init__(self, batches):
+        self._batches = batches
+        self.on_batch = None
+
+    def __iter__(self):
+        for edges in self._batches:
+            if self.on_batch is not None:
+                self.on_batch(edges)
+            yield from edges
+
+
+def keyset_stream(connection_type, queryset, keys, args, batch_size):
+    """Like keyset_connection for a ``first``/``after`` page, with streamed edges.
+
+    Rows are read batch_size at a time, each batch seeking past the last,
+    so memory stays bounded whatever the page size. The page info comes
+    from small queries on the ordering keys alone.
+    """
+    first, after, before = args['first'], args.get('after'), args.get('before')
+    queryset = queryset.order_by(*[('-' if desc else '') + field.attname for field, desc in keys])
+    queryset = load_keys(queryset, keys)
+    if after:
+        queryset = queryset.filter(seek(keys, decode_cursor(after, keys), forward=True))
+    if before:
+        queryset = queryset.filter(seek(keys, decode_cursor(before, keys), forward=False))
+
+    bounds = queryset.select_related(None).prefetch_related(None).only(*[field.attname for field, _ in keys])
+    start = list(bounds[:1]) if first else []
+    end = list(bounds[first - 1:first + 1]) if start else []
+    has_next_page = len(end) > 1
+    if not end and start:
+        end = list(bounds.reverse()[:1])
+
+    def batches():
+        remaining = first
+        rows = queryset
+        while remaining > 0:
+            nodes = list(rows[:min(batch_size, remaining)])
+            if not nodes:
+                return
+            yield [connection_type.Edge(node=node, cursor=encode_cursor(node, keys)) for node in nodes]
+            remaining -= len(nodes)
+            values = [field.value_from_object(nodes[-1]) for field, _ in keys]
+            rows = queryset.filter(seek(keys, values, forward=True))
+
+    page_info = page_info_adapter(
+        encode_cursor(start[0], keys) if start else None,
+        encode_cursor(end[0], keys) if end else None,
+        bool(after),
+        has_next_page,
+    )
+    return connection_adapter(connection_type, StreamedEdges(batches()), page_info)
@@ -0,0 +1,52 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryStore:
+    """Documents addressable by the sha256 of their text.
+
+    Client-registered documents live in a Django cache, so every worker
+    sees them. Trusted documents are registered by the server and are
+    executed without validation.
+    """
+
+    key_prefix = 'graphql:apq:'
+
+    def __init__(self, cache_alias='default', timeout=None, trusted=()):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.trusted = {}
+        for query in trusted:
+            self.register_trusted(query)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get(self, sha256_hash):
+        """Return ``(query, trusted)``; ``query`` is None on a miss."""
+        if sha256_hash in self.trusted:
+            return self.trusted[sha256_hash], True
+        return self.cache.get(self.key_prefix + sha256_hash), False
+
+    def register(self, sha256_hash, query):
+        if sha256_hash not in self.trusted:
+            self.cache.set(self.key_prefix + sha256_hash, query, self.timeout)
+
+    def register_trusted(self, query):
+        sha256_hash = query_hash(query)
+        self.trusted[sha256_hash] = query
+        return sha256_hash
+
+
+persisted_queries = PersistedQueryStore(
+    cache_alias=getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_CACHE', 'default'),
+    timeout=getattr(settings, 'GRAPHQL_PERSISTED_QUERIES_TIMEOUT', None),
+    trusted=getattr(settings, 'GRAPHQL_TRUSTED_OPERATIONS', ()),
+)
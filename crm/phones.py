@@ -0,0 +1,72 @@
+"""Normalized phone numbers for indexed prefix lookups.
+
+Customer.phone is stored as typed, e.g. ``+1234567890`` or
+``123-456-7890``. ``phone_digits`` holds the same number as E.164 digits
+without the plus sign: international numbers keep their digits, national
+ones get DEFAULT_COUNTRY_CODE in front. Filters normalize their input the
+same way and match prefixes with a range, which any B-tree index serves.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import Customer
+from .response_cache import response_cache
+
+_options = getattr(settings, 'CRM_PHONE', {})
+DEFAULT_COUNTRY_CODE = _options.get('DEFAULT_COUNTRY_CODE', '1')
+
+
+def normalize_phone(value):
+    """Return the E.164 digits of ``value``, or None if it has no digits.
+
+    Also applies to prefixes: ``+1234`` gives ``1234`` and ``123-4`` gives
+    ``11234`` with the default country code 1.
+    """
+    if not value:
+        return None
+    digits = ''.join(ch for ch in value if ch.isascii() and ch.isdigit())
+    if not digits:
+        return None
+    if value.strip().startswith('+'):
+        return digits
+    return DEFAULT_COUNTRY_CODE + digits
+
+
+def prefix_range(prefix):
+    """Lookups matching the digit strings that start with ``prefix``.
+
+    ``:`` sorts right after ``9``, so every digit string starting with
+    ``prefix`` lies in ``[prefix, prefix + ':')``.
+    """
+    return {'phone_digits__gte': prefix, 'phone_digits__lt': prefix + ':'}
+
+
+def backfill_phone_digits(batch_size=1000, model=Customer):
+    """Fill ``phone_digits`` of existing customers, a batch at a time.
+
+    ``model`` lets a data migration pass its historical Customer. Returns
+    the number of customers updated.
+    """
+    updated = 0
+    last_pk = 0
+    while True:
+        customers = list(
+            model._default_manager.filter(pk__gt=last_pk, phone__isnull=False)
+            .order_by('pk')
+            .only('phone', 'phone_digits')[:batch_size]
+        )
+        if not customers:
+            break
+        last_pk = customers[-1].pk
+        stale = []
+        for customer in customers:
+            digits = normalize_phone(customer.phone)
+            if customer.phone_digits != digits:
+                customer.phone_digits = digits
+                stale.append(customer)
+        if stale:
+            with transaction.atomic():
+                model._default_manager.bulk_update(stale, ['phone_digits'])
+                response_cache.invalidate_on_commit(model)
+            updated += len(stale)
+    return updated
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+_options = getattr(settings, 'GRAPHQL_SQL_REPORT', {})
+REPORT_HEADER = _options.get('HEADER', 'X-GraphQL-Debug')
+N_PLUS_ONE_THRESHOLD = _options.get('N_PLUS_ONE_THRESHOLD', 3)
+
+
+def path_pattern(path):
+    """``allOrders.edges.*.node.customer`` for any edge index."""
+    return '.'.join('*' if isinstance(key, int) else key for key in path.as_list())
+
+
+class SQLAccountingMiddleware:
+    """Graphene middleware recording the SQL run by one GraphQL operation.
+
+    Each statement is attributed to the innermost field being resolved
+    when it ran, or to ``""`` when it ran outside any resolver (wrap the
+    execution in ``recording()`` to catch those). The same statement run
+    N_PLUS_ONE_THRESHOLD or more times from one field inside a list is
+    reported as an N+1. Use a new instance per operation.
+    """
+
+    def __init__(self, n_plus_one_threshold=N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.queries = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def resolve(self, next, root, info, **args):
+        # Fields may resolve on pool threads, each with its own connection
+        with self.recording(), self._resolving(path_pattern(info.path)):
+            return next(root, info, **args)
+
+    @contextmanager
+    def recording(self):
+        """Record the statements run on this thread's connection."""
+        if getattr(self._local, 'recording', False):
+            yield
+            return
+        self._local.recording = True
+        try:
+            with connection.execute_wrapper(self._record):
+                yield
+        finally:
+            self._local.recording = False
+
+    @contextmanager
+    def _resolving(self, path):
+        previous = getattr(self._local, 'path', '')
+        self._local.path = path
+        try:
+            yield
+        finally:
+            self._local.path = previous
+
+    def _record(self, execute, sql, params, many, context):
+        path = getattr(self._local, 'path', '')
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.queries.append((path, sql, duration))
+
+    def report(self):
+        paths = defaultdict(lambda: {'queries': 0, 'time': 0.0})
+        shapes = defaultdict(int)
+        for path, sql, duration in self.queries:
+            paths[path]['queries'] += 1
+            paths[path]['time'] += duration
+            shapes[path, sql] += 1
+        return {
+            'queries': len(self.queries),
+            'timeMs': round(sum(duration for _, _, duration in self.queries) * 1000, 3),
+            'paths': {
+                path: {'queries': stats['queries'], 'timeMs': round(stats['time'] * 1000, 3)}
+                for path, stats in paths.items()
+            },
+            'nPlusOne': [
+                {'path': path, 'sql': sql, 'count': count}
+                for (path, sql), count in shapes.items()
+                if count >= self.n_plus_one_threshold and '*' in path.split('.')
+            ],
+        }
+
+
+def wants_sql_report(request):
+    """Whether ``request`` asked for, and may see, the SQL report."""
+    if 'sql' not in request.headers.get(REPORT_HEADER, '').lower():
+        return False
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user and user.is_staff)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+from graphql import ExecutionResult, TypeInfo, TypeInfoVisitor, Visitor, get_named_type, print_ast, visit
+
+from .documents import document_cache
+
+
+@lru_cache(maxsize=512)
+def document_profile(schema, query):
+    """Return ``(digest, tags)`` for a valid query.
+
+    ``digest`` hashes the normalized document text, so queries that differ
+    only in whitespace or comments share entries. ``tags`` are the labels
+    of the models behind every object type the document selects; object
+    types that are not backed by a model list the models they are computed
+    from in a ``cache_models`` attribute.
+    """
+    document, _ = document_cache.get(schema, query)
+    type_info = TypeInfo(schema)
+    tags = set()
+
+    class TagCollector(Visitor):
+        def enter_field(self, node, *args):
+            graphene_type = getattr(get_named_type(type_info.get_type()), 'graphene_type', None)
+            model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+            if model is not None:
+                tags.add(model._meta.label)
+            for model in getattr(graphene_type, 'cache_models', ()):
+                tags.add(model._meta.label)
+
+    visit(document, TypeInfoVisitor(type_info, TagCollector()))
+    digest = hashlib.sha256(print_ast(document).encode()).hexdigest()
+    return digest, frozenset(tags)
+
+
+class ResponseCache:
+    """Cache of query results, invalidated by model tags.
+
+    Each entry records the version of every tag it read; bumping a tag's
+    version with ``invalidate`` turns all entries reading that model into
+    misses. Entries older than ``timeout`` but within
+    ``stale_while_revalidate`` seconds are served as they are while a
+    background thread re-executes the query.
+    """
+
+    key_prefix = 'graphql:response:'
+    tag_prefix = 'graphql:tag:'
+
+    def __init__(self, cache_alias='default', timeout=0, stale_while_revalidate=0, vary_headers=()):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.stale_while_revalidate = stale_while_revalidate
+        self.vary_headers = tuple(vary_headers)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return self.timeout > 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def key(self, request, digest, variables, operation_name):
+        parts = [digest, operation_name or '', json.dumps(variables or {}, sort_keys=True, default=str)]
+        parts.extend(request.META.get(header, '') for header in self.vary_headers)
+        return self.key_prefix + hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def tag_versions(self, tags):
+        keys = {self.tag_prefix + tag: tag for tag in tags}
+        found = self.cache.get_many(keys)
+        return {tag: found.get(key, 0) for key, tag in keys.items()}
+
+    def get_or_execute(self, key, tags, execute):
+        """Return the cached result for ``key`` or store ``execute()``'s."""
+        result = self.lookup(key, tags, execute)
+        if result is None:
+            result = self._execute_and_store(key, tags, execute)
+        return result
+
+    def lookup(self, key, tags, refresh):
+        """Return the cached result for ``key``, or None on a miss.
+
+        A stale hit schedules ``refresh`` (a callable returning an
+        ExecutionResult) to run in the background.
+        """
+        entry = self.cache.get(key)
+        if entry is None or entry['versions'] != self.tag_versions(tags):
+            return None
+        age = time.time() - entry['created']
+        if age >= self.timeout + self.stale_while_revalidate:
+            return None
+        if age >= self.timeout:
+            self._refresh(key, tags, refresh)
+        return ExecutionResult(data=entry['data'])
+
+    def store(self, key, versions, result):
+        if not result.errors:
+            entry = {'data': result.data, 'versions': versions, 'created': time.time()}
+            self.cache.set(key, entry, self.timeout + self.stale_while_revalidate)
+
+    def _execute_and_store(self, key, tags, execute):
+        # Read the versions first so a write that lands during execution
+        # leaves the stored entry stale rather than wrongly fresh.
+        versions = self.tag_versions(tags)
+        result = execute()
+        self.store(key, versions, result)
+        return result
+
+    def _refresh(self, key, tags, execute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='graphql-swr')
+        self._executor.submit(self._run_refresh, key, tags, execute)
+
+    def _run_refresh(self, key, tags, execute):
+        try:
+            self._execute_and_store(key, tags, execute)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            connections.close_all()
+
+    def invalidate(self, *models):
+        for model in models:
+            key = self.tag_prefix + model._meta.label
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, 1, None)
+
+    def invalidate_on_commit(self, *models):
+        transaction.on_commit(lambda: self.invalidate(*models))
+
+
+_options = getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {})
+response_cache = ResponseCache(
+    cache_alias=_options.get('CACHE', 'default'),
+    timeout=_options.get('TIMEOUT', 0),
+    stale_while_revalidate=_options.get('STALE_WHILE_REVALIDATE', 0),
+    vary_headers=_options.get('VARY_HEADERS', ()),
+)
@@ -0,0 +1,175 @@
+"""Daily sales rollups, so dashboards read one row per day instead of every order.
+
+Order paths call ``record_orders`` in the transaction that creates the
+orders, and order deletes call ``subtract_orders`` before deleting;
+``rebuild_rollups`` recomputes days from the orders themselves, for
+backfills and after bulk edits that bypass the order mutations.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySalesRollup, Order
+from .response_cache import response_cache
+
+
+def order_day(order):
+    """The day an order counts towards, in the current time zone."""
+    if timezone.is_aware(order.order_date):
+        return timezone.localdate(order.order_date)
+    return order.order_date.date()
+
+
+class _DayTotals:
+    def __init__(self):
+        self.order_count = 0
+        self.revenue = Decimal('0')
+        self.units = 0
+        self.customers = set()
+
+
+def record_orders(orders, units):
+    """Add newly created ``orders`` to the rollups of their days.
+
+    ``units`` maps each order's pk to the number of products on it. Must be
+    called inside the transaction that created the orders, so the rollups
+    commit or roll back with them. Rows are updated with F() increments,
+    which keeps concurrent order paths from losing each other's counts.
+    """
+    days = defaultdict(_DayTotals)
+    for order in orders:
+        totals = days[order_day(order)]
+        totals.order_count += 1
+        totals.revenue += order.total_amount
+        totals.units += units[order.pk]
+        totals.customers.add(order.customer_id)
+    if not days:
+        return
+
+    # A customer already seen on a day is not a new distinct customer of it
+    seen = set(
+        Order.objects.filter(
+            customer_id__in={pk for totals in days.values() for pk in totals.customers},
+            order_date__date__in=list(days),
+        )
+        .exclude(pk__in=[order.pk for order in orders])
+        .annotate(day=TruncDate('order_date'))
+        .values_list('day', 'customer_id')
+        .distinct()
+    )
+
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(day=day) for day in days], ignore_conflicts=True
+    )
+    for day, totals in sorted(days.items()):
+        DailySalesRollup.objects.filter(day=day).update(
+            order_count=F('order_count') + totals.order_count,
+            revenue=F('revenue') + totals.revenue,
+            units=F('units') + totals.units,
+            customer_count=F('customer_count') + sum(
+                1 for pk in totals.customers if (day, pk) not in seen
+            ),
+        )
+    response_cache.invalidate_on_commit(DailySalesRollup)
+
+
+def subtract_orders(orders):
+    """Take ``orders``, about to be deleted, off the rollups of their days.
+
+    Call inside the deleting transaction, before the delete. Days left
+    without orders are removed, as ``rebuild_rollups`` would.
+    """
+    doomed = Order.objects.filter(pk__in=orders.values('pk')).annotate(day=TruncDate('order_date'))
+    daily = {
+        row['day']: row
+        for row in doomed.values('day').annotate(order_count=Count('pk'), revenue=Sum('total_amount')).order_by()
+    }
+    if not daily:
+        return
+    units = dict(
+        Order.products.through.objects.filter(order__in=doomed.values('pk'))
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day')
+        .annotate(units=Count('pk'))
+        .order_by()
+        .values_list('day', 'units')
+    )
+    pairs = set(doomed.values_list('day', 'customer_id').distinct())
+    # A customer with other orders that day stays a distinct customer of it
+    remaining = set(
+        Order.objects.filter(
+            customer_id__in={pk for _, pk in pairs},
+            order_date__date__in=list(daily),
+        )
+        .exclude(pk__in=doomed.values('pk'))
+        .annotate(day=TruncDate('order_date'))
+        .values_list('day', 'customer_id')
+        .distinct()
+    )
+    gone = defaultdict(int)
+    for day, pk in pairs - remaining:
+        gone[day] += 1
+
+    for day, row in sorted(daily.items()):
+        DailySalesRollup.objects.filter(day=day).update(
+            order_count=F('order_count') - row['order_count'],
+            revenue=F('revenue') - row['revenue'],
+            units=F('units') - units.get(day, 0),
+            customer_count=F('customer_count') - gone[day],
+        )
+    DailySalesRollup.objects.filter(day__in=list(daily), order_count=0).delete()
+    response_cache.invalidate_on_commit(DailySalesRollup)
+
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute the rollups of the days from ``start`` to ``end`` from the orders.
+
+    Either bound may be None for an open range. Returns the number of days
+    written; days without orders are removed.
+    """
+    orders = Order.objects.all()
+    rollups = DailySalesRollup.objects.all()
+    if start is not None:
+        orders = orders.filter(order_date__date__gte=start)
+        rollups = rollups.filter(day__gte=start)
+    if end is not None:
+        orders = orders.filter(order_date__date__lte=end)
+        rollups = rollups.filter(day__lte=end)
+
+    daily = (
+        orders.annotate(day=TruncDate('order_date'))
+        .values('day')
+        .annotate(
+            order_count=Count('pk'),
+            revenue=Sum('total_amount'),
+            customer_count=Count('customer_id', distinct=True),
+        )
+        .order_by()
+    )
+    units = dict(
+        Order.products.through.objects.filter(order__in=orders)
+        .annotate(day=TruncDate('order__order_date'))
+        .values('day')
+        .annotate(units=Count('pk'))
+        .order_by()
+        .values_list('day', 'units')
+    )
+    with transaction.atomic():
+        rows = [
+            DailySalesRollup(
+                day=row['day'],
+                order_count=row['order_count'],
+                revenue=row['revenue'] or Decimal('0'),
+                customer_count=row['customer_count'],
+                units=units.get(row['day'], 0),
+            )
+            for row in daily
+        ]
+        rollups.delete()
+        DailySalesRollup.objects.bulk_create(rows, batch_size=500)
+        response_cache.invalidate_on_commit(DailySalesRollup)
+    return len(rows)
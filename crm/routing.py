@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .consumers import GraphQLWebsocketConsumer
+
+websocket_urlpatterns = [
+    path('graphql', GraphQLWebsocketConsumer.as_asgi()),
+]
@@ -1,31 +1,103 @@
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
-from .models import Customer, Order
+from .models import Customer, DailySalesRollup, Order
 from crm.models import Product
 from .filters import CustomerFilter, ProductFilter, OrderFilter
+from .fields import CRMConnectionField
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+from .response_cache import response_cache
+from .counts import count_queryset
+from .rollups import record_orders
+from . import customer_stats
+from .search import search as full_text_search
+from .bulk import CREATED, ERROR, UPDATED, create_customers, create_orders, upsert_products
+from .subscriptions import ORDER_CREATED, PRODUCT_STOCK_CHANGED, broker, publish_on_commit
 from django.db import transaction
+from django.db.models import Sum
+from django.db.models.query import QuerySet
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError as DjangoValidationError
 import re
 from decimal import Decimal
 from django.utils import timezone
+from graphene.utils.str_converters import to_snake_case
+
+# Connections
+class CRMConnection(graphene.relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(approximate=graphene.Boolean(default_value=False))
+
+    def resolve_total_count(self, info, approximate=False):
+        # The offset path has already counted; unfiltered counts are cached
+        if getattr(self, "length", None) is not None:
+            return self.length
+        if isinstance(self.iterable, QuerySet):
+            return count_queryset(self.iterable, approximate)
+        return len(self.iterable)
 
 # Types
 class CustomerType(DjangoObjectType):
     class Meta:
         model = Customer
-        fields = ("id", "name", "email", "phone")
+        fields = ("id", "name", "email", "phone", "order_count", "lifetime_value", "last_order_at")
+        use_connection = True
+        connection_class = CRMConnection
 
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
-        fields = ("id", "name", "price", "stock")
+        fields = ("id", "sku", "name", "price", "stock")
+        use_connection = True
+        connection_class = CRMConnection
 
 class OrderType(DjangoObjectType):
+    products = graphene.NonNull(graphene.List(graphene.NonNull(ProductType)))
+
     class Meta:
         model = Order
         fields = ("id", "customer", "products", "order_date", "total_amount")
+        use_connection = True
+        connection_class = CRMConnection
+
+    @classmethod
+    def prepare_batch(cls, info, orders):
+        get_loaders(info).prepare_orders(orders)
+
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info):
+        if "products" in getattr(self, "_prefetched_objects_cache", {}):
+            return list(self.products.all())
+        return get_loaders(info).order_products.load(self.pk)
+
+class SearchResult(graphene.Union):
+    cache_models = (Customer, Product)
+
+    class Meta:
+        types = (CustomerType, ProductType)
+
+class DailySalesType(DjangoObjectType):
+    class Meta:
+        model = DailySalesRollup
+        fields = ("day", "order_count", "revenue", "customer_count", "units")
+
+class CRMDashboardType(graphene.ObjectType):
+    # Tags cached responses, so new orders invalidate them
+    cache_models = (DailySalesRollup,)
+
+    start = graphene.Date()
+    end = graphene.Date()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    units = graphene.Int()
+    average_order_value = graphene.Decimal()
+    days = graphene.List(DailySalesType)
 
 # Mutations
 class CreateCustomer(graphene.Mutation):
@@ -38,7 +110,8 @@ class CreateCustomer(graphene.Mutation):
     success = graphene.Boolean()
     message = graphene.String()
 
-    def validate_phone(self, phone):
+    @staticmethod
+    def validate_phone(phone):
         if not phone:
             return True
         pattern = r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$"
@@ -52,39 +125,33 @@ class CreateCustomer(graphene.Mutation):
             return CreateCustomer(success=False, message="Invalid email format.")
         if Customer.objects.filter(email=email).exists():
             return CreateCustomer(success=False, message="Email already exists.")
-        if phone and not self.validate_phone(phone):
+        if phone and not CreateCustomer.validate_phone(phone):
             return CreateCustomer(success=False, message="Invalid phone format.")
         customer = Customer(name=name, email=email, phone=phone)
         customer.save()
+        response_cache.invalidate_on_commit(Customer)
         return CreateCustomer(customer=customer, success=True, message="Customer created.")
 
+class CustomerInput(graphene.InputObjectType):
+    # Checked per row, so a bad row is reported instead of failing the batch
+    name = graphene.String()
+    email = graphene.String()
+    phone = graphene.String()
+
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
-        customers = graphene.List(graphene.JSONString, required=True)
+        customers = graphene.List(CustomerInput, required=True)
     created = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
     @classmethod
     def mutate(cls, root, info, customers):
-        created = []
-        errors = []
         with transaction.atomic():
-            for idx, data in enumerate(customers):
-                name = data.get("name")
-                email = data.get("email")
-                phone = data.get("phone")
-                try:
-                    validate_email(email)
-                    if Customer.objects.filter(email=email).exists():
-                        raise Exception(f"Email already exists: {email}")
-                    if phone and not re.match(r"^(\+\d{10,15}|\d{3}-\d{3}-\d{4})$", phone):
-                        raise Exception(f"Invalid phone format: {phone}")
-                    customer = Customer(name=name, email=email, phone=phone)
-                    customer.save()
-                    created.append(customer)
-                except Exception as e:
-                    errors.append(f"Row {idx+1}: {str(e)}")
-        return BulkCreateCustomers(created=created, errors=errors)
+            created, errors = create_customers([row or {} for row in customers])
+        return BulkCreateCustomers(
+            created=created,
+            errors=[f"Row {idx+1}: {message}" for idx, message in sorted(errors.items())],
+        )
 
 class CreateProduct(graphene.Mutation):
     class Arguments:
@@ -104,34 +171,105 @@ class CreateProduct(graphene.Mutation):
                 return CreateProduct(success=False, message="Stock cannot be negative.")
             product = Product(name=name, price=price, stock=stock or 0)
             product.save()
+            response_cache.invalidate_on_commit(Product)
             return CreateProduct(product=product, success=True, message="Product created.")
         except Exception as e:
             return CreateProduct(success=False, message=str(e))
 
+class ProductInput(graphene.InputObjectType):
+    sku = graphene.String(required=True)
+    name = graphene.String(required=True)
+    price = graphene.Decimal(required=True)
+    stock = graphene.Int()
+
+class UpsertStatus(graphene.Enum):
+    CREATED = CREATED
+    UPDATED = UPDATED
+    ERROR = ERROR
+
+class ProductUpsertResult(graphene.ObjectType):
+    row = graphene.Int()
+    sku = graphene.String()
+    status = graphene.Field(UpsertStatus)
+    message = graphene.String()
+    product = graphene.Field(ProductType)
+
+class UpsertProducts(graphene.Mutation):
+    class Arguments:
+        products = graphene.List(graphene.NonNull(ProductInput), required=True)
+    results = graphene.List(ProductUpsertResult)
+    created = graphene.Int()
+    updated = graphene.Int()
+
+    @classmethod
+    def mutate(cls, root, info, products):
+        results = [
+            ProductUpsertResult(row=idx+1, sku=row["sku"], status=status, message=message, product=product)
+            for idx, (row, (status, product, message)) in enumerate(zip(products, upsert_products(products)))
+        ]
+        return UpsertProducts(
+            results=results,
+            created=sum(1 for result in results if result.status == CREATED),
+            updated=sum(1 for result in results if result.status == UPDATED),
+        )
+
 class CreateOrder(graphene.Mutation):
     class Arguments:
         customer_id = graphene.ID(required=True)
         product_ids = graphene.List(graphene.ID, required=True)
         order_date = graphene.DateTime()
-
+    order = graphene.Field(OrderType)
+    success = graphene.Boolean()
+    message = graphene.String()
 
     def mutate(self, info, customer_id, product_ids, order_date=None):
         try:
             customer = Customer.objects.get(pk=customer_id)
         except Customer.DoesNotExist:
-            return CreateOrder()
-        products = Product.objects.filter(pk__in=product_ids)
-        if not products or len(products) != len(product_ids):
-            return CreateOrder()
+            return CreateOrder(success=False, message="Invalid customer ID.")
         if not product_ids:
-            return CreateOrder()
-        order = Order(customer=customer, order_date=order_date or timezone.now())
-        order.save()
-        order.products.set(products)
-        total = sum([p.price for p in products], Decimal("0"))
-        order.total_amount = Decimal(total)
-        order.save()
-        return CreateOrder()
+            return CreateOrder(success=False, message="At least one product must be selected.")
+        products = Product.objects.filter(pk__in=product_ids)
+        if len(products) != len(set(product_ids)):
+            return CreateOrder(success=False, message="Invalid product ID.")
+        with transaction.atomic():
+            order = Order(customer=customer, order_date=order_date or timezone.now())
+            order.save()
+            order.products.set(products)
+            total = sum([p.price for p in products], Decimal("0"))
+            order.total_amount = Decimal(total)
+            order.save()
+            record_orders([order], {order.pk: len(products)})
+            customer_stats.add_orders([order])
+            customer.refresh_from_db(fields=["order_count", "lifetime_value", "last_order_at"])
+        response_cache.invalidate_on_commit(Order)
+        publish_on_commit(ORDER_CREATED, {"id": order.pk})
+        return CreateOrder(order=order, success=True, message="Order created.")
+
+class OrderInput(graphene.InputObjectType):
+    # Optional so an unknown or missing customer or product is reported
+    # against its own row
+    customer_id = graphene.ID()
+    product_ids = graphene.List(graphene.ID)
+    order_date = graphene.DateTime()
+
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        orders = graphene.List(OrderInput, required=True)
+    created = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    @classmethod
+    def mutate(cls, root, info, orders):
+        created, errors = create_orders([row or {} for row in orders])
+        # The order lines are known already; spare the loader its query
+        loaders = get_loaders(info)
+        for order, products in created:
+            loaders.order_products.prime(order.pk, products)
+        return BulkCreateOrders(
+            created=[order for order, _ in created],
+            errors=[f"Row {idx+1}: {message}" for idx, message in sorted(errors.items())],
+        )
 
 # Main Mutation class
 
@@ -148,6 +286,9 @@ class UpdateLowStockProducts(graphene.Mutation):
             product.stock += 10
             product.save()
             updated.append(product)
+        if updated:
+            response_cache.invalidate_on_commit(Product)
+            publish_on_commit(PRODUCT_STOCK_CHANGED, {"ids": [p.pk for p in updated]})
         msg = f"{len(updated)} products restocked." if updated else "No products needed restocking."
         return UpdateLowStockProducts(updated_products=updated, message=msg)
 
@@ -156,37 +297,85 @@ class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
+    upsert_products = UpsertProducts.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
 
 
 # Query with filtering and ordering
 class Query(graphene.ObjectType):
     hello = graphene.String()
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter, order_by=graphene.List(of_type=graphene.String))
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter, order_by=graphene.List(of_type=graphene.String))
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter, order_by=graphene.List(of_type=graphene.String))
+    all_customers = CRMConnectionField(CustomerType, filterset_class=CustomerFilter, order_by=graphene.List(of_type=graphene.String))
+    all_products = CRMConnectionField(ProductType, filterset_class=ProductFilter, order_by=graphene.List(of_type=graphene.String))
+    all_orders = CRMConnectionField(OrderType, filterset_class=OrderFilter, order_by=graphene.List(of_type=graphene.String))
+    search = graphene.List(SearchResult, term=graphene.String(required=True), first=graphene.Int(default_value=20))
+    crm_dashboard = graphene.Field(CRMDashboardType, start=graphene.Date(required=True), end=graphene.Date(required=True))
 
     def resolve_hello(self, info):
         return "Hello, GraphQL!"
 
     def resolve_all_customers(self, info, **kwargs):
-        qs = Customer.objects.all()
+        qs = optimize_queryset(Customer.objects.all(), info)
         order_by = kwargs.get('order_by')
         if order_by:
-            qs = qs.order_by(*order_by)
+            qs = qs.order_by(*[to_snake_case(field) for field in order_by])
         return qs
 
     def resolve_all_products(self, info, **kwargs):
-        qs = Product.objects.all()
+        qs = optimize_queryset(Product.objects.all(), info)
         order_by = kwargs.get('order_by')
         if order_by:
-            qs = qs.order_by(*order_by)
+            qs = qs.order_by(*[to_snake_case(field) for field in order_by])
         return qs
 
     def resolve_all_orders(self, info, **kwargs):
-        qs = Order.objects.all()
+        qs = optimize_queryset(Order.objects.all(), info)
         order_by = kwargs.get('order_by')
         if order_by:
-            qs = qs.order_by(*order_by)
+            qs = qs.order_by(*[to_snake_case(field) for field in order_by])
         return qs
+
+    def resolve_search(self, info, term, first=20):
+        return full_text_search(term, first)
+
+    def resolve_crm_dashboard(self, info, start, end):
+        # One rollup row per day, however many orders the range holds
+        rollups = DailySalesRollup.objects.filter(day__range=(start, end)).order_by("day")
+        totals = rollups.aggregate(order_count=Sum("order_count"), revenue=Sum("revenue"), units=Sum("units"))
+        order_count = totals["order_count"] or 0
+        revenue = (totals["revenue"] or Decimal("0")).quantize(Decimal("0.01"))
+        average = (revenue / order_count).quantize(Decimal("0.01")) if order_count else Decimal("0")
+        return CRMDashboardType(
+            start=start,
+            end=end,
+            order_count=order_count,
+            revenue=revenue,
+            units=totals["units"] or 0,
+            average_order_value=average,
+            days=rollups,
+        )
+
+
+# Subscriptions, served over WebSockets (see crm.consumers). Events carry
+# primary keys only; each subscription loads what its selection needs.
+class Subscription(graphene.ObjectType):
+    order_created = graphene.Field(OrderType)
+    product_stock_changed = graphene.Field(ProductType)
+
+    async def subscribe_order_created(root, info):
+        async for event in broker.listen(ORDER_CREATED):
+            yield event
+
+    async def subscribe_product_stock_changed(root, info):
+        async for event in broker.listen(PRODUCT_STOCK_CHANGED):
+            for pk in event["ids"]:
+                yield {"id": pk}
+
+    def resolve_order_created(root, info):
+        qs = optimize_queryset(Order.objects.all(), info, info.field_nodes)
+        return qs.filter(pk=root["id"]).first()
+
+    def resolve_product_stock_changed(root, info):
+        qs = optimize_queryset(Product.objects.all(), info, info.field_nodes)
+        return qs.filter(pk=root["id"]).first()
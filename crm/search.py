@@ -0,0 +1,154 @@
+"""Substring search over customer and product text through SQLite FTS5.
+
+Migration 0005 mirrors Customer.name/email and Product.name into FTS5
+tables with the trigram tokenizer, kept in sync by triggers. A trigram
+index answers "contains x" from the index, where ``LIKE '%x%'`` reads
+every row. Terms shorter than a trigram, and databases without the
+tables, fall back to icontains.
+
+SQLite alters a table by rebuilding it, which drops its triggers, so
+``restore_triggers`` runs after every migrate and puts back any that
+are missing; the tables ``search_table`` found are looked up again then.
+"""
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product
+
+SEARCH_TABLES = {
+    Customer: ('crm_customer_search', ('name', 'email')),
+    Product: ('crm_product_search', ('name',)),
+}
+# The statements of migration 0005, by FTS5 table and trigger name
+TRIGGERS = {
+    'crm_customer_search': {
+        'crm_customer_search_insert': """CREATE TRIGGER crm_customer_search_insert AFTER INSERT ON crm_customer BEGIN
+            INSERT INTO crm_customer_search(rowid, name, email) VALUES (new.id, new.name, new.email);
+        END""",
+        'crm_customer_search_delete': """CREATE TRIGGER crm_customer_search_delete AFTER DELETE ON crm_customer BEGIN
+            INSERT INTO crm_customer_search(crm_customer_search, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+        END""",
+        'crm_customer_search_update': """CREATE TRIGGER crm_customer_search_update AFTER UPDATE OF name, email ON crm_customer BEGIN
+            INSERT INTO crm_customer_search(crm_customer_search, rowid, name, email)
+            VALUES ('delete', old.id, old.name, old.email);
+            INSERT INTO crm_customer_search(rowid, name, email) VALUES (new.id, new.name, new.email);
+        END""",
+    },
+    'crm_product_search': {
+        'crm_product_search_insert': """CREATE TRIGGER crm_product_search_insert AFTER INSERT ON crm_product BEGIN
+            INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+        END""",
+        'crm_product_search_delete': """CREATE TRIGGER crm_product_search_delete AFTER DELETE ON crm_product BEGIN
+            INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        END""",
+        'crm_product_search_update': """CREATE TRIGGER crm_product_search_update AFTER UPDATE OF name ON crm_product BEGIN
+            INSERT INTO crm_product_search(crm_product_search, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO crm_product_search(rowid, name) VALUES (new.id, new.name);
+        END""",
+    },
+}
+MIN_TERM_LENGTH = 3
+MAX_RESULTS = 100
+
+# Tables found per database alias, looked up on first use and forgotten
+# after each migrate
+_tables = {}
+
+
+def search_table(model, using):
+    """The FTS5 table of ``model`` on database ``using``, or None."""
+    table = SEARCH_TABLES.get(model, (None,))[0]
+    connection = connections[using]
+    if table is None or connection.vendor != 'sqlite':
+        return None
+    if using not in _tables:
+        with connection.cursor() as cursor:
+            _tables[using] = set(connection.introspection.table_names(cursor))
+    return table if table in _tables[using] else None
+
+
+def restore_triggers(using='default'):
+    """Recreate the missing sync triggers of each FTS5 table on ``using``.
+
+    A table that lost any of its triggers may have missed writes, so its
+    index is rebuilt from the content table. Returns the tables repaired.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    repaired = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        for table, triggers in TRIGGERS.items():
+            if table not in tables or existing.issuperset(triggers):
+                continue
+            for name, statement in triggers.items():
+                if name not in existing:
+                    cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            repaired.append(table)
+    return repaired
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """post_migrate receiver for restore_triggers."""
+    _tables.pop(using, None)
+    restore_triggers(using)
+
+
+def match_expression(term, column=None):
+    """An FTS5 query matching ``term`` as a substring, in one column or any."""
+    phrase = '"{}"'.format(term.replace('"', '""'))
+    return f'{column} : {phrase}' if column else phrase
+
+
+def filter_contains(queryset, column, term):
+    """Filter ``queryset`` to rows whose ``column`` contains ``term``, ignoring case."""
+    table = search_table(queryset.model, queryset.db)
+    if table is None or len(term) < MIN_TERM_LENGTH:
+        return queryset.filter(**{f'{column}__icontains': term})
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match_expression(term, column)]
+    ))
+
+
+def ranked_matches(model, term, limit, using='default'):
+    """Return ``[(pk, rank)]`` of the ``model`` rows matching ``term``, best first.
+
+    Ranks are FTS5 bm25 scores, lower being better; the icontains
+    fallback cannot rank and gives every row 0.
+    """
+    table = search_table(model, using)
+    if table is None or len(term) < MIN_TERM_LENGTH:
+        condition = Q()
+        for column in SEARCH_TABLES[model][1]:
+            condition |= Q(**{f'{column}__icontains': term})
+        pks = model.objects.using(using).filter(condition).order_by('pk').values_list('pk', flat=True)[:limit]
+        return [(pk, 0.0) for pk in pks]
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, rank FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s',
+            [match_expression(term), limit],
+        )
+        return cursor.fetchall()
+
+
+def search(term, limit=20, using='default'):
+    """Customers and products matching ``term``, best ranked first."""
+    limit = max(0, min(limit, MAX_RESULTS))
+    hits = [
+        (rank, model, pk)
+        for model in SEARCH_TABLES
+        for pk, rank in ranked_matches(model, term, limit, using)
+    ]
+    hits.sort(key=lambda hit: hit[0])
+    hits = hits[:limit]
+    rows = {
+        model: model.objects.using(using).in_bulk([pk for _, hit_model, pk in hits if hit_model is model])
+        for model in SEARCH_TABLES
+    }
+    return [rows[model][pk] for _, model, pk in hits if pk in rows[model]]
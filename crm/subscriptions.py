@@ -0,0 +1,91 @@
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+ORDER_CREATED = 'orderCreated'
+PRODUCT_STOCK_CHANGED = 'productStockChanged'
+
+
+def group_name(topic):
+    return 'graphql.' + topic
+
+
+def publish(topic, payload):
+    """Send ``payload`` to every process listening on ``topic``."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    async_to_sync(layer.group_send)(group_name(topic), {'type': 'graphql.event', 'payload': payload})
+
+
+def publish_on_commit(topic, payload):
+    transaction.on_commit(lambda: publish(topic, payload))
+
+
+def publish_many(topic, payloads):
+    """Send each of ``payloads`` on ``topic``, entering the event loop once."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+
+    async def send():
+        for payload in payloads:
+            await layer.group_send(group_name(topic), {'type': 'graphql.event', 'payload': payload})
+
+    async_to_sync(send)()
+
+
+def publish_many_on_commit(topic, payloads):
+    transaction.on_commit(lambda: publish_many(topic, payloads))
+
+
+class TopicBroker:
+    """Per-process fan-out of channel layer events to local listeners.
+
+    The process joins a topic's group once, however many subscriptions
+    listen to it, so each event crosses the channel layer once per process
+    and is then handed to the local listeners in memory.
+    """
+
+    queue_size = 100
+
+    def __init__(self):
+        self._queues = defaultdict(set)
+        self._listeners = {}
+
+    async def listen(self, topic):
+        """Yield the payloads published on ``topic`` from now on."""
+        queue = asyncio.Queue(self.queue_size)
+        self._queues[topic].add(queue)
+        if topic not in self._listeners:
+            self._listeners[topic] = asyncio.ensure_future(self._receive(topic))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues[topic].discard(queue)
+            if not self._queues[topic]:
+                self._listeners.pop(topic).cancel()
+
+    async def _receive(self, topic):
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        channel = await layer.new_channel()
+        await layer.group_add(group_name(topic), channel)
+        try:
+            while True:
+                message = await layer.receive(channel)
+                for queue in list(self._queues[topic]):
+                    if queue.full():
+                        # A listener that cannot keep up loses its oldest events
+                        queue.get_nowait()
+                    queue.put_nowait(message['payload'])
+        finally:
+            await layer.group_discard(group_name(topic), channel)
+
+
+broker = TopicBroker()
@@ -1,43 +1,148 @@
-
 from datetime import datetime
-import requests
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+import math
+import time
+from collections import Counter
+from decimal import Decimal
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.db.models import Count, Max, Min, Sum
+
+from .models import Customer, Order
+
+_options = getattr(settings, 'CRM_REPORT', {})
+ORDERS_PER_PARTITION = _options.get('ORDERS_PER_PARTITION', 250000)
+MAX_PARTITIONS = _options.get('MAX_PARTITIONS', 16)
+TOP = _options.get('TOP', 5)
+LOG_FILE = '/tmp/crm_report_log.txt'
+
+
+def write_log(message):
+    with open(LOG_FILE, 'a') as f:
+        f.write(message + '\n')
+
+
+def plan_partitions():
+    """Split the order ids into ranges of about ORDERS_PER_PARTITION ids.
+
+    Sizes come from the id bounds, two index lookups, rather than a count.
+    Returns ``[(None, None)]``, the whole table, when there are no orders.
+    """
+    bounds = Order.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    low, high = bounds['low'], bounds['high']
+    if low is None:
+        return [(None, None)]
+    span = high - low + 1
+    count = max(1, min(MAX_PARTITIONS, math.ceil(span / ORDERS_PER_PARTITION)))
+    size = math.ceil(span / count)
+    return [(start, min(start + size - 1, high)) for start in range(low, high + 1, size)]
+
+
+def build_crm_report(low=None, high=None):
+    """Aggregate the orders with ids from ``low`` to ``high``, in the database.
+
+    Returns a partial report: order count, revenue, and per-customer and
+    per-product breakdowns, with the time each query took. Partials of
+    disjoint ranges combine with ``merge_reports``; everything is kept
+    JSON-serializable so partials can travel as task results.
+    """
+    orders = Order.objects.all()
+    lines = Order.products.through.objects.all()
+    if low is not None:
+        orders = orders.filter(pk__gte=low, pk__lte=high)
+        lines = lines.filter(order_id__gte=low, order_id__lte=high)
+    timings = {}
+
+    started = time.perf_counter()
+    totals = orders.aggregate(count=Count('pk'), revenue=Sum('total_amount'))
+    timings['orders_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    customers = {
+        str(row['customer_id']): [row['orders'], str(row['revenue'] or 0)]
+        for row in orders.values('customer_id').annotate(orders=Count('pk'), revenue=Sum('total_amount')).order_by()
+    }
+    timings['customers_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    products = {
+        str(product_id): units
+        for product_id, units in lines.values('product_id').annotate(units=Count('pk')).order_by().values_list('product_id', 'units')
+    }
+    timings['products_ms'] = (time.perf_counter() - started) * 1000
+
+    return {
+        'orders': totals['count'],
+        'revenue': str(totals['revenue'] or 0),
+        'customers': customers,
+        'products': products,
+        'timings': timings,
+    }
+
+
+def merge_reports(partials):
+    """Combine partial reports of disjoint order ranges into one.
+
+    The result is itself a partial report, so merges can be nested.
+    Timings are summed, giving the total query time spent.
+    """
+    orders = 0
+    revenue = Decimal('0')
+    customers = {}
+    products = Counter()
+    timings = Counter()
+    for partial in partials:
+        orders += partial['orders']
+        revenue += Decimal(partial['revenue'])
+        for pk, (count, amount) in partial['customers'].items():
+            merged = customers.setdefault(pk, [0, Decimal('0')])
+            merged[0] += count
+            merged[1] += Decimal(amount)
+        products.update(partial['products'])
+        timings.update(partial['timings'])
+    return {
+        'orders': orders,
+        'revenue': str(revenue),
+        'customers': {pk: [count, str(amount)] for pk, (count, amount) in customers.items()},
+        'products': dict(products),
+        'timings': dict(timings),
+    }
 
-from celery import shared_task
 
 @shared_task
-def generate_crm_report():
-    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_file = '/tmp/crm_report_log.txt'
+def crm_report_partition(low, high):
+    return build_crm_report(low, high)
+
+
+@shared_task
+def merge_crm_report(partials, started_at, now):
+    """Chord callback: merge the partials and write the report to the log."""
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql",
-            verify=True,
-            retries=3,
+        report = merge_reports(partials)
+        top_customers = sorted(report['customers'].items(), key=lambda item: Decimal(item[1][1]), reverse=True)[:TOP]
+        top_products = Counter(report['products']).most_common(TOP)
+        timings = ', '.join(f"{name} {ms:.1f}" for name, ms in report['timings'].items())
+        message = (
+            f"{now} - Report: {Customer.objects.count()} customers, {report['orders']} orders, "
+            f"{Decimal(report['revenue']):.2f} revenue"
+            f" | top customers: {', '.join(f'#{pk} {amount}' for pk, (count, amount) in top_customers) or '-'}"
+            f" | top products: {', '.join(f'#{pk} x{units}' for pk, units in top_products) or '-'}"
+            f" ({len(partials)} partitions, {timings}, wall {(time.time() - started_at) * 1000:.1f} ms)"
         )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        query = gql('''
-            query {
-                allCustomers { totalCount }
-                allOrders { totalCount edges { node { totalAmount } } }
-            }
-        ''')
-        result = client.execute(query)
-        num_customers = result.get('allCustomers', {}).get('totalCount', 0)
-        orders_data = result.get('allOrders', {})
-        num_orders = orders_data.get('totalCount', 0)
-        total_revenue = 0
-        for edge in orders_data.get('edges', []):
-            node = edge.get('node', {})
-            amt = node.get('totalAmount')
-            if amt:
-                try:
-                    total_revenue += float(amt)
-                except Exception:
-                    pass
-        message = f"{now} - Report: {num_customers} customers, {num_orders} orders, {total_revenue} revenue"
     except Exception as e:
         message = f"{now} - Error generating report: {e}"
-    with open(log_file, 'a') as f:
-        f.write(message + '\n')
+    write_log(message)
+    return message
+
+
+@shared_task
+def generate_crm_report():
+    """Aggregate the order id partitions in parallel and merge them in a chord."""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        partitions = plan_partitions()
+    except Exception as e:
+        write_log(f"{now} - Error generating report: {e}")
+        return None
+    header = [crm_report_partition.s(low, high) for low, high in partitions]
+    return chord(header)(merge_crm_report.s(time.time(), now)).id
@@ -0,0 +1,42 @@
+"""Helpers for tests of the crm GraphQL schema."""
+import json
+
+from django.test import RequestFactory
+from graphene_django.settings import graphene_settings
+
+from .loaders import Loaders
+from .profiling import SQLAccountingMiddleware
+
+
+def assert_query_budget(query, max_queries, operation_name=None, variables=None, allow_n_plus_one=False):
+    """Execute an operation and fail if it runs more than ``max_queries`` SQL statements.
+
+    Also fails on any N+1 pattern unless ``allow_n_plus_one``. Returns the
+    ExecutionResult, so the test can check the data too.
+
+        assert_query_budget(ORDERS_QUERY, 2, operation_name='RecentOrders')
+    """
+    request = RequestFactory().post('/graphql')
+    request.loaders = Loaders()
+    accounting = SQLAccountingMiddleware()
+    result = graphene_settings.SCHEMA.execute(
+        query,
+        operation_name=operation_name,
+        variables=variables,
+        context_value=request,
+        middleware=[accounting],
+    )
+    # Raised explicitly rather than with assert, which python -O strips
+    if result.errors:
+        raise AssertionError(result.errors)
+    report = accounting.report()
+    name = operation_name or 'operation'
+    if report['queries'] > max_queries:
+        raise AssertionError('{} ran {} queries, over its budget of {}:\n{}'.format(
+            name, report['queries'], max_queries, json.dumps(report, indent=2)
+        ))
+    if not allow_n_plus_one and report['nPlusOne']:
+        raise AssertionError('{} has N+1 queries:\n{}'.format(
+            name, json.dumps(report['nPlusOne'], indent=2)
+        ))
+    return result
@@ -0,0 +1,1109 @@
+import asyncio
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import graphene
+import msgpack
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphene_django.settings import graphene_settings
+from graphql import ExecutionResult, parse
+from graphql.validation import NoSchemaIntrospectionCustomRule
+
+from . import bulk, counts, encoding, search, tasks
+from .cost import CostAnalyzer
+from .celery import app as celery_app
+from .consumers import PROTOCOL, GraphQLWebsocketConsumer
+from .customer_stats import repair_customer_stats
+from .documents import DocumentCache
+from .loaders import Loaders
+from .models import Customer, DailySalesRollup, Order, Product
+from .persisted import persisted_queries, query_hash
+from .phones import backfill_phone_digits
+from .response_cache import ResponseCache, response_cache
+from .rollups import rebuild_rollups
+from .search import restore_triggers
+from .subscriptions import ORDER_CREATED, group_name
+from .testing import assert_query_budget
+from .views import CRMGraphQLView
+
+
+def execute(query, variables=None):
+    """Run an operation through the schema as the /graphql view would."""
+    request = RequestFactory().post('/graphql')
+    request.loaders = Loaders()
+    result = graphene_settings.SCHEMA.execute(query, variables=variables, context_value=request)
+    if result.errors:
+        raise AssertionError(result.errors)
+    return result.data
+
+
+def create_orders(count, customers=50, products=20):
+    customers = Customer.objects.bulk_create(
+        [Customer(name=f'Customer {i}', email=f'customer{i}@example.com') for i in range(customers)]
+    )
+    products = Product.objects.bulk_create(
+        [Product(name=f'Product {i}', price=Decimal(10 + i)) for i in range(products)]
+    )
+    orders = Order.objects.bulk_create(
+        [Order(customer=customers[i % len(customers)], total_amount=Decimal(i)) for i in range(count)]
+    )
+    Order.products.through.objects.bulk_create([
+        Order.products.through(order_id=order.pk, product_id=products[(order.pk + n) % len(products)].pk)
+        for order in orders
+        for n in range(2)
+    ])
+    return orders
+
+
+ORDER_PAGE = '''
+query($first: Int) {
+  allOrders(first: $first) {
+    edges { node { id totalAmount customer { id name } products { id name } } }
+  }
+}
+'''
+
+
+class OrderPageQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(1000)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for first in (10, 100, 1000):
+            with self.subTest(first=first), self.assertNumQueries(2):
+                data = execute(ORDER_PAGE, {'first': first})
+            edges = data['allOrders']['edges']
+            self.assertEqual(len(edges), first)
+            self.assertTrue(all(edge['node']['customer'] for edge in edges))
+            self.assertTrue(all(len(edge['node']['products']) == 2 for edge in edges))
+
+    def test_default_page_size(self):
+        data = execute('{ allOrders { edges { node { id } } } }')
+        self.assertEqual(len(data['allOrders']['edges']), 100)
+
+    def test_products_stay_non_null(self):
+        field = graphene_settings.SCHEMA.graphql_schema.get_type('OrderType').fields['products']
+        self.assertEqual(str(field.type), '[ProductType!]!')
+
+
+class KeysetCursorQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(150)
+
+    def test_cursors_do_not_load_deferred_keys(self):
+        query = '{ allOrders(orderBy: ["-orderDate"], first: 100) { edges { cursor node { id } } } }'
+        with self.assertNumQueries(1):
+            data = execute(query)
+        self.assertEqual(len(data['allOrders']['edges']), 100)
+
+    def test_next_page_follows_the_last_cursor(self):
+        query = '''
+        query($after: String) {
+          allOrders(orderBy: ["-orderDate"], first: 100, after: $after) {
+            edges { cursor node { id } }
+            pageInfo { hasNextPage endCursor }
+          }
+        }
+        '''
+        first = execute(query)['allOrders']
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        with self.assertNumQueries(1):
+            second = execute(query, {'after': first['pageInfo']['endCursor']})['allOrders']
+        ids = [edge['node']['id'] for edge in first['edges'] + second['edges']]
+        self.assertEqual(len(ids), 150)
+        self.assertEqual(len(set(ids)), 150)
+
+
+class ApproximateCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        orders = create_orders(2000)
+        start = timezone.now() - timedelta(days=len(orders))
+        for i, order in enumerate(orders):
+            order.order_date = start + timedelta(days=i)
+        Order.objects.bulk_update(orders, ['order_date'])
+        cls.since = orders[1500].order_date
+
+    @mock.patch.object(counts, 'SAMPLE_RANGES', 20)
+    @mock.patch.object(counts, 'SAMPLE_SIZE', 200)
+    def test_estimate_covers_recent_rows(self):
+        query = '''
+        query($since: DateTime) {
+          allOrders(orderDateGte: $since, first: 1) { totalCount(approximate: true) }
+        }
+        '''
+        estimate = execute(query, {'since': self.since.isoformat()})['allOrders']['totalCount']
+        exact = Order.objects.filter(order_date__gte=self.since).count()
+        self.assertEqual(exact, 500)
+        self.assertAlmostEqual(estimate, exact, delta=exact * 0.1)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(300)
+        rebuild_rollups()
+
+    def test_all_orders(self):
+        assert_query_budget('''
+        query RecentOrders {
+          allOrders(first: 100, orderBy: ["-orderDate"]) {
+            totalCount
+            pageInfo { hasNextPage endCursor }
+            edges { cursor node { id orderDate totalAmount customer { id name email } products { id name price } } }
+          }
+        }
+        ''', 3, operation_name='RecentOrders')
+
+    def test_all_customers(self):
+        assert_query_budget('''
+        query Customers {
+          allCustomers(first: 50) { edges { node { id name orderCount lifetimeValue lastOrderAt } } }
+        }
+        ''', 1, operation_name='Customers')
+
+    def test_all_products(self):
+        assert_query_budget('''
+        query Products {
+          allProducts(first: 20, orderBy: ["-price"]) { edges { node { id name price stock } } }
+        }
+        ''', 1, operation_name='Products')
+
+    def test_search(self):
+        result = assert_query_budget('''
+        query Search {
+          search(term: "Product") { ... on ProductType { id name } ... on CustomerType { id name } }
+        }
+        ''', 4, operation_name='Search')
+        self.assertTrue(result.data['search'])
+
+    def test_budget_failures_raise(self):
+        with self.assertRaisesRegex(AssertionError, 'Customers ran 1 queries, over its budget of 0'):
+            assert_query_budget('query Customers { allCustomers { edges { node { id } } } }', 0, 'Customers')
+        with self.assertRaisesRegex(AssertionError, 'noSuchField'):
+            assert_query_budget('{ allCustomers { edges { node { noSuchField } } } }', 5)
+
+    def test_dashboard(self):
+        result = assert_query_budget('''
+        query Dashboard {
+          crmDashboard(start: "2020-01-01", end: "2030-12-31") { orderCount revenue days { day orderCount revenue } }
+        }
+        ''', 2, operation_name='Dashboard')
+        self.assertEqual(result.data['crmDashboard']['orderCount'], 300)
+
+
+class IncrementalDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(10)
+
+    def test_plain_query_is_prepared_once(self):
+        body = json.dumps({'query': '{ allOrders(first: 5) { edges { node { id } } } }'})
+        with mock.patch.object(
+            CRMGraphQLView, 'prepare_operation', autospec=True, side_effect=CRMGraphQLView.prepare_operation
+        ) as prepare:
+            response = self.client.post(
+                '/graphql', body, content_type='application/json',
+                headers={'Accept': 'multipart/mixed, application/json'},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']['allOrders']['edges']), 5)
+        self.assertEqual(prepare.call_count, 1)
+
+
+class OrderCreatedSubscriptionTests(TransactionTestCase):
+    async def joined(self, topic):
+        # The broker joins the topic's group in a background task
+        layer = get_channel_layer()
+        for _ in range(100):
+            if layer.groups.get(group_name(topic)):
+                return
+            await asyncio.sleep(0.01)
+        self.fail('the broker never joined {}'.format(topic))
+
+    async def test_create_order_pushes_payload(self):
+        customer = await Customer.objects.acreate(name='Ada', email='ada@example.com')
+        product = await Product.objects.acreate(name='Widget', price=Decimal('12.50'))
+        communicator = WebsocketCommunicator(GraphQLWebsocketConsumer.as_asgi(), '/graphql', subprotocols=[PROTOCOL])
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, PROTOCOL)
+        try:
+            await communicator.send_json_to({'type': 'connection_init'})
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'connection_ack'})
+            await communicator.send_json_to({
+                'id': '1',
+                'type': 'subscribe',
+                'payload': {'query': 'subscription { orderCreated { id totalAmount customer { name } } }'},
+            })
+            await self.joined(ORDER_CREATED)
+
+            data = await database_sync_to_async(execute)(
+                'mutation($customer: ID!, $products: [ID]!) {'
+                ' createOrder(customerId: $customer, productIds: $products) { success order { id } } }',
+                {'customer': customer.pk, 'products': [product.pk]},
+            )
+            self.assertTrue(data['createOrder']['success'])
+
+            message = await communicator.receive_json_from(timeout=5)
+            self.assertEqual(message, {
+                'id': '1',
+                'type': 'next',
+                'payload': {'data': {'orderCreated': {
+                    'id': data['createOrder']['order']['id'],
+                    'totalAmount': str(product.price),
+                    'customer': {'name': customer.name},
+                }}},
+            })
+        finally:
+            await communicator.disconnect()
+
+
+class CRMReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(1000)
+
+    def setUp(self):
+        # Runs the chord in process, on in-memory transports
+        eager = {
+            'task_always_eager': True,
+            'task_eager_propagates': True,
+            'broker_url': 'memory://',
+            'result_backend': 'cache+memory://',
+        }
+        saved = {name: celery_app.conf[name] for name in eager}
+        celery_app.conf.update(eager)
+        self.addCleanup(celery_app.conf.update, saved)
+        self.log = tempfile.NamedTemporaryFile('r', suffix='.txt')
+        self.addCleanup(self.log.close)
+        self.enterContext(mock.patch.object(tasks, 'LOG_FILE', self.log.name))
+
+    @staticmethod
+    def without_timings(report):
+        return {key: value for key, value in report.items() if key != 'timings'}
+
+    @mock.patch.object(tasks, 'ORDERS_PER_PARTITION', 150)
+    def test_chord_matches_serial_report(self):
+        merge_reports = tasks.merge_reports
+        merged = []
+
+        def merge(partials):
+            merged.append(merge_reports(partials))
+            return merged[-1]
+
+        with mock.patch.object(tasks, 'merge_reports', side_effect=merge):
+            tasks.generate_crm_report.delay()
+
+        self.assertEqual(len(tasks.plan_partitions()), 7)
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(self.without_timings(merged[0]), self.without_timings(tasks.build_crm_report()))
+        message = self.log.read()
+        self.assertIn('1000 orders', message)
+        self.assertIn('(7 partitions', message)
+
+
+class OrderDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        orders = create_orders(500)
+        now = timezone.now()
+        for i, order in enumerate(orders):
+            order.order_date = now - timedelta(days=i % 7)
+        Order.objects.bulk_update(orders, ['order_date'])
+        repair_customer_stats()
+        rebuild_rollups()
+
+    def assertCountersCorrect(self):
+        self.assertEqual(repair_customer_stats(dry_run=True), (50, 0))
+
+    def assertRollupsCorrect(self):
+        rollups = list(DailySalesRollup.objects.order_by('day').values())
+        rebuild_rollups()
+        self.assertEqual(rollups, list(DailySalesRollup.objects.order_by('day').values()))
+
+    def delete(self, delete):
+        with mock.patch.object(response_cache, 'invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = delete()
+        self.assertEqual(
+            {model for call in invalidate.call_args_list for model in call.args},
+            {Customer, DailySalesRollup, Order},
+        )
+        return result
+
+    def test_queryset_delete_adjusts_counters_and_rollups(self):
+        # One counter UPDATE and one rollup UPDATE per day (7 here), not per order
+        with self.assertNumQueries(18):
+            deleted, _ = self.delete(Order.objects.filter(total_amount__lt=300).delete)
+        self.assertEqual(deleted, 300 + 600)
+        self.assertCountersCorrect()
+        self.assertRollupsCorrect()
+        customer = Customer.objects.get(name='Customer 0')
+        self.assertEqual(customer.order_count, 4)
+        self.assertEqual(customer.last_order_at, customer.orders.latest('order_date').order_date)
+
+    def test_deleting_a_day_removes_its_rollup(self):
+        day = timezone.localdate() - timedelta(days=3)
+        self.delete(Order.objects.filter(order_date__date=day).delete)
+        self.assertFalse(DailySalesRollup.objects.filter(day=day).exists())
+        self.assertEqual(DailySalesRollup.objects.count(), 6)
+        self.assertRollupsCorrect()
+
+    def test_instance_delete_adjusts_counters_and_rollups(self):
+        order = Order.objects.last()
+        self.delete(order.delete)
+        self.assertCountersCorrect()
+        self.assertRollupsCorrect()
+        self.assertEqual(Customer.objects.get(pk=order.customer_id).order_count, 9)
+
+
+class PhoneDigitsTests(TestCase):
+    def test_save_derives_phone_digits(self):
+        customer = Customer.objects.create(name='Ada', email='ada@example.com', phone='123-456-7890')
+        self.assertEqual(customer.phone_digits, '11234567890')
+        customer.phone = '+44 20 7946 0000'
+        customer.save(update_fields=['phone'])
+        customer.refresh_from_db()
+        self.assertEqual(customer.phone_digits, '442079460000')
+        customer.phone = None
+        customer.save()
+        self.assertIsNone(Customer.objects.get(pk=customer.pk).phone_digits)
+
+    def test_phone_prefix_filter_finds_saved_customer(self):
+        Customer.objects.create(name='Ada', email='ada@example.com', phone='+1234567890')
+        data = execute('{ allCustomers(phonePattern: "+1234") { edges { node { name } } } }')
+        self.assertEqual([edge['node']['name'] for edge in data['allCustomers']['edges']], ['Ada'])
+
+    def test_backfill_fills_rows_written_without_save(self):
+        Customer.objects.create(name='Ada', email='ada@example.com', phone='123-456-7890')
+        Customer.objects.update(phone_digits=None)
+        self.assertEqual(backfill_phone_digits(), 1)
+        self.assertEqual(Customer.objects.get().phone_digits, '11234567890')
+
+
+class SearchTriggerTests(TestCase):
+    SEARCH = '{ search(term: "Widget") { ... on ProductType { name } } }'
+
+    def test_migrated_product_search_follows_writes(self):
+        product = Product.objects.create(name='Blue Widget', sku='W-1', price=Decimal('5'))
+        self.assertEqual(execute(self.SEARCH)['search'], [{'name': 'Blue Widget'}])
+        product.name = 'Blue Gadget'
+        product.save()
+        self.assertEqual(execute(self.SEARCH)['search'], [])
+
+    def test_restore_triggers_recreates_and_rebuilds(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER crm_product_search_insert')
+        Product.objects.create(name='Blue Widget', price=Decimal('5'))
+        self.assertEqual(execute(self.SEARCH)['search'], [])
+
+        self.assertEqual(restore_triggers(), ['crm_product_search'])
+        self.assertEqual(execute(self.SEARCH)['search'], [{'name': 'Blue Widget'}])
+        Product.objects.create(name='Red Widget', price=Decimal('6'))
+        self.assertEqual(len(execute(self.SEARCH)['search']), 2)
+        self.assertEqual(restore_triggers(), [])
+
+
+class ContainsFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Customer.objects.create(name='Alice Smith', email='alice@example.com')
+        Customer.objects.create(name='Bob Jones', email='bob@sample.org')
+
+    def names(self, filters):
+        with CaptureQueriesContext(connection) as queries:
+            data = execute('{ allCustomers(%s) { edges { node { name } } } }' % filters)
+        sql = ' '.join(query['sql'] for query in queries)
+        return sorted(edge['node']['name'] for edge in data['allCustomers']['edges']), sql
+
+    def test_name_and_email_use_the_search_table(self):
+        names, sql = self.names('nameIcontains: "SMIT"')
+        self.assertEqual(names, ['Alice Smith'])
+        self.assertIn('crm_customer_search MATCH', sql)
+        names, sql = self.names('emailIcontains: "sample"')
+        self.assertEqual(names, ['Bob Jones'])
+        self.assertIn('crm_customer_search MATCH', sql)
+
+    def test_short_terms_fall_back_to_icontains(self):
+        names, sql = self.names('nameIcontains: "jo"')
+        self.assertEqual(names, ['Bob Jones'])
+        self.assertNotIn('MATCH', sql)
+        names, _ = self.names('emailIcontains: "@"')
+        self.assertEqual(names, ['Alice Smith', 'Bob Jones'])
+
+    def test_tables_are_looked_up_again_after_migrate(self):
+        search._tables['default'] = set()
+        self.assertIsNone(search.search_table(Customer, 'default'))
+        search.restore_search_triggers(sender=None, using='default')
+        self.assertEqual(search.search_table(Customer, 'default'), 'crm_customer_search')
+
+
+class ProductFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(name='Ann', email='ann@example.com')
+        cls.red, cls.blue, cls.green = (
+            Product.objects.create(name=f'{colour} Widget', price=Decimal('5'))
+            for colour in ('Red', 'Blue', 'Green')
+        )
+        cls.orders = [Order.objects.create(customer=customer, total_amount=Decimal('5')) for _ in range(4)]
+        cls.orders[0].products.set([cls.red, cls.blue])
+        cls.orders[1].products.set([cls.red])
+        cls.orders[2].products.set([cls.green])
+
+    def order_ids(self, filters):
+        data = execute('{ allOrders(%s) { totalCount edges { node { id } } } }' % filters)['allOrders']
+        ids = [int(edge['node']['id']) for edge in data['edges']]
+        self.assertEqual(data['totalCount'], len(ids))
+        return sorted(ids)
+
+    def pks(self, *indexes):
+        return [self.orders[index].pk for index in indexes]
+
+    def test_any_lists_each_order_once(self):
+        ids = [self.red.pk, self.blue.pk, self.red.pk]
+        self.assertEqual(self.order_ids(f'productIdsAny: {ids}'), self.pks(0, 1))
+
+    def test_all_ignores_repeated_ids(self):
+        ids = [self.red.pk, self.blue.pk, self.red.pk]
+        self.assertEqual(self.order_ids(f'productIdsAll: {ids}'), self.pks(0))
+        self.assertEqual(self.order_ids(f'productIdsAll: {[self.red.pk] * 2}'), self.pks(0, 1))
+
+    def test_exists_filters_list_each_order_once(self):
+        self.assertEqual(self.order_ids(f'productId: {self.red.pk}'), self.pks(0, 1))
+        self.assertEqual(self.order_ids('productName: "widget"'), self.pks(0, 1, 2))
+
+    def test_empty_and_invalid_lists_match_nothing(self):
+        for name in ('productIdsAny', 'productIdsAll'):
+            with self.subTest(name):
+                self.assertEqual(self.order_ids(f'{name}: []'), [])
+                self.assertEqual(self.order_ids(f'{name}: ["x"]'), [])
+                self.assertEqual(self.order_ids(f'{name}: null'), self.pks(0, 1, 2, 3))
+
+
+class BulkCreateCustomersTests(TestCase):
+    MUTATION = """
+    mutation($customers: [CustomerInput]!) {
+      bulkCreateCustomers(customers: $customers) { created { email orderCount lifetimeValue lastOrderAt } errors }
+    }
+    """
+
+    def bulk_create(self, customers):
+        return execute(self.MUTATION, {'customers': customers})['bulkCreateCustomers']
+
+    def test_bad_rows_are_reported_and_the_rest_created(self):
+        Customer.objects.create(name='Old', email='old@example.com')
+        data = self.bulk_create([
+            {'name': 'Ann', 'email': 'ann@example.com', 'phone': '+15551234567'},
+            {'name': 'Bad Email', 'email': 'not-an-email'},
+            {'name': 'Bad Phone', 'email': 'phone@example.com', 'phone': '12345'},
+            {'name': 'Old Again', 'email': 'old@example.com'},
+            {'name': 'Ann Again', 'email': 'ann@example.com'},
+            {'name': 'Bob', 'email': 'bob@example.com', 'phone': '555-123-4567'},
+        ])
+        self.assertEqual([customer['email'] for customer in data['created']], ['ann@example.com', 'bob@example.com'])
+        self.assertEqual(data['errors'], [
+            "Row 2: ['Enter a valid email address.']",
+            'Row 3: Invalid phone format: 12345',
+            'Row 4: Email already exists: old@example.com',
+            'Row 5: Email already exists: ann@example.com',
+        ])
+        self.assertEqual(Customer.objects.get(email='ann@example.com').name, 'Ann')
+        self.assertFalse(Customer.objects.filter(email='phone@example.com').exists())
+
+    def test_new_rows_have_phone_digits_and_zero_counters(self):
+        data = self.bulk_create([
+            {'name': 'Ann', 'email': 'ann@example.com', 'phone': '+15551234567'},
+            {'name': 'Bob', 'email': 'bob@example.com', 'phone': '555-123-4567'},
+            {'name': 'Cy', 'email': 'cy@example.com'},
+        ])
+        self.assertEqual(data['errors'], [])
+        for customer in data['created']:
+            self.assertEqual(
+                (customer['orderCount'], customer['lifetimeValue'], customer['lastOrderAt']), (0, '0.00', None)
+            )
+        self.assertEqual(
+            dict(Customer.objects.values_list('email', 'phone_digits')),
+            {'ann@example.com': '15551234567', 'bob@example.com': '15551234567', 'cy@example.com': None},
+        )
+
+    def test_email_taken_after_the_lookup_is_reported(self):
+        Customer.objects.create(name='Old', email='old@example.com')
+        # The first lookup misses the stored email, as if it were inserted concurrently
+        lookups = iter([lambda *args: set(), bulk.existing_values])
+        with mock.patch('crm.bulk.existing_values', side_effect=lambda *args: next(lookups)(*args)):
+            data = self.bulk_create([
+                {'name': 'Old Again', 'email': 'old@example.com'},
+                {'name': 'Ann', 'email': 'ann@example.com'},
+            ])
+        self.assertEqual([customer['email'] for customer in data['created']], ['ann@example.com'])
+        self.assertEqual(data['errors'], ['Row 1: Email already exists: old@example.com'])
+        self.assertEqual(Customer.objects.get(email='old@example.com').name, 'Old')
+
+
+class UpsertProductsTests(TestCase):
+    MUTATION = """
+    mutation($products: [ProductInput!]!) {
+      upsertProducts(products: $products) { created updated results { row sku status message } }
+    }
+    """
+    QUERY = json.dumps({'query': '{ allProducts { edges { node { sku price stock } } } }'})
+
+    def setUp(self):
+        response_cache.cache.clear()
+        Product.objects.create(sku='A-1', name='Anvil', price=Decimal('10'), stock=5)
+
+    def upsert(self, products):
+        return execute(self.MUTATION, {'products': products})['upsertProducts']
+
+    def products(self):
+        response = self.client.post('/graphql', self.QUERY, content_type='application/json')
+        return {
+            edge['node']['sku']: (edge['node']['price'], edge['node']['stock'])
+            for edge in response.json()['data']['allProducts']['edges']
+        }
+
+    def test_created_and_updated_are_counted(self):
+        data = self.upsert([
+            {'sku': 'A-1', 'name': 'Anvil', 'price': '12.50'},
+            {'sku': 'B-1', 'name': 'Bell', 'price': '3', 'stock': 7},
+            {'sku': 'C-1', 'name': 'Cog', 'price': '0'},
+        ])
+        self.assertEqual((data['created'], data['updated']), (1, 1))
+        self.assertEqual([result['status'] for result in data['results']], ['UPDATED', 'CREATED', 'ERROR'])
+        self.assertEqual(data['results'][2]['message'], 'Price must be positive.')
+        # A row without a stock keeps the stored one
+        self.assertEqual(
+            set(Product.objects.values_list('sku', 'price', 'stock')),
+            {('A-1', Decimal('12.50'), 5), ('B-1', Decimal('3.00'), 7)},
+        )
+
+    def test_repeated_sku_is_taken_from_its_first_row(self):
+        data = self.upsert([
+            {'sku': 'B-1', 'name': 'Bell', 'price': '3'},
+            {'sku': 'B-1', 'name': 'Big Bell', 'price': '4'},
+        ])
+        self.assertEqual((data['created'], data['updated']), (1, 0))
+        self.assertEqual(data['results'][1], {
+            'row': 2, 'sku': 'B-1', 'status': 'ERROR', 'message': 'SKU B-1 appears more than once.',
+        })
+        self.assertEqual(Product.objects.get(sku='B-1').name, 'Bell')
+
+    def test_changes_invalidate_cached_product_lists(self):
+        self.assertEqual(self.products(), {'A-1': ('10.00', 5)})
+        with self.assertNumQueries(0):
+            self.products()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upsert([
+                {'sku': 'A-1', 'name': 'Anvil', 'price': '11', 'stock': 2},
+                {'sku': 'B-1', 'name': 'Bell', 'price': '3', 'stock': 7},
+            ])
+        self.assertEqual(self.products(), {'A-1': ('11.00', 2), 'B-1': ('3.00', 7)})
+
+
+class BulkCreateOrdersTests(TestCase):
+    CREATE_ORDER = """
+    mutation($customerId: ID!, $productIds: [ID]!, $orderDate: DateTime) {
+      createOrder(customerId: $customerId, productIds: $productIds, orderDate: $orderDate) { success message }
+    }
+    """
+    BULK_CREATE_ORDERS = """
+    mutation($orders: [OrderInput]!) { bulkCreateOrders(orders: $orders) { created { totalAmount } errors } }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ann, cls.bob = (
+            Customer.objects.create(name=name, email=f'{name.lower()}@example.com') for name in ('Ann', 'Bob')
+        )
+        cls.anvil, cls.bell, cls.cog = (
+            Product.objects.create(sku=sku, name=sku, price=price)
+            for sku, price in (('ANVIL', Decimal('10')), ('BELL', Decimal('2.50')), ('COG', Decimal('0.75')))
+        )
+
+    def setUp(self):
+        # Ann already ordered on the first day
+        execute(self.CREATE_ORDER, {
+            'customerId': self.ann.pk, 'productIds': [self.cog.pk], 'orderDate': '2024-03-01T08:00:00+00:00',
+        })
+
+    def rows(self):
+        return [
+            {'customerId': self.ann.pk, 'productIds': [self.anvil.pk, self.bell.pk],
+             'orderDate': '2024-03-01T09:00:00+00:00'},
+            {'customerId': self.bob.pk, 'productIds': [self.bell.pk, self.bell.pk],
+             'orderDate': '2024-03-01T10:00:00+00:00'},
+            {'customerId': self.ann.pk, 'productIds': [self.cog.pk], 'orderDate': '2024-03-02T09:00:00+00:00'},
+            {'customerId': self.bob.pk, 'productIds': [self.anvil.pk, self.cog.pk],
+             'orderDate': '2024-03-02T11:00:00+00:00'},
+            {'customerId': self.bob.pk, 'productIds': [self.cog.pk], 'orderDate': '2024-03-02T12:00:00+00:00'},
+        ]
+
+    def state_after(self, create):
+        with transaction.atomic():
+            create()
+            orders = sorted(
+                (order.customer.email, order.order_date, order.total_amount,
+                 tuple(sorted(product.sku for product in order.products.all())))
+                for order in Order.objects.select_related('customer').prefetch_related('products')
+            )
+            customers = sorted(Customer.objects.values_list('email', 'order_count', 'lifetime_value', 'last_order_at'))
+            rollups = list(DailySalesRollup.objects.order_by('day').values_list(
+                'day', 'order_count', 'revenue', 'customer_count', 'units'
+            ))
+            transaction.set_rollback(True)
+        return orders, customers, rollups
+
+    def test_matches_create_order_per_row(self):
+        def one_by_one():
+            for row in self.rows():
+                self.assertTrue(execute(self.CREATE_ORDER, row)['createOrder']['success'])
+
+        def in_bulk():
+            data = execute(self.BULK_CREATE_ORDERS, {'orders': self.rows()})['bulkCreateOrders']
+            self.assertEqual(data['errors'], [])
+            self.assertEqual(len(data['created']), 5)
+
+        expected = self.state_after(one_by_one)
+        self.assertEqual(len(expected[0]), 6)
+        self.assertEqual(self.state_after(in_bulk), expected)
+
+    def test_unknown_customers_and_products_fail_their_rows(self):
+        rows = self.rows()[:2] + [
+            {'customerId': 999999, 'productIds': [self.anvil.pk]},
+            {'customerId': 'abc', 'productIds': [self.anvil.pk]},
+            {'customerId': self.ann.pk, 'productIds': [self.anvil.pk, 999999]},
+            {'customerId': self.ann.pk, 'productIds': []},
+        ]
+        data = execute(self.BULK_CREATE_ORDERS, {'orders': rows})['bulkCreateOrders']
+        self.assertEqual([order['totalAmount'] for order in data['created']], ['12.50', '2.50'])
+        self.assertEqual(data['errors'], [
+            'Row 3: Invalid customer ID.',
+            'Row 4: Invalid customer ID.',
+            'Row 5: Invalid product ID.',
+            'Row 6: At least one product must be selected.',
+        ])
+        self.assertEqual(Order.objects.count(), 3)
+
+
+def selected_columns(sql):
+    """The ``"table"."column"`` names in the SELECT list of ``sql``."""
+    return set(re.findall(r'"(\w+)"\."(\w+)"', sql[:sql.index(' FROM ')]))
+
+
+class OptimizerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(10)
+
+    def page_columns(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            execute(query)
+        return selected_columns(queries[0]['sql'])
+
+    def test_aliases_are_merged(self):
+        columns = self.page_columns('{ allOrders(first: 5) { edges { node { a: totalAmount b: totalAmount } } } }')
+        self.assertEqual(columns, {('crm_order', 'id'), ('crm_order', 'total_amount')})
+
+    def test_fragment_spread(self):
+        columns = self.page_columns('''
+        { allOrders(first: 5) { edges { node { ...OrderFields } } } }
+        fragment OrderFields on OrderType { orderDate }
+        ''')
+        self.assertEqual(columns, {('crm_order', 'id'), ('crm_order', 'order_date')})
+
+    def test_inline_fragment_on_the_connection(self):
+        columns = self.page_columns('''
+        { allOrders(first: 5) { ... on OrderTypeConnection { edges { node { id totalAmount } } } } }
+        ''')
+        self.assertEqual(columns, {('crm_order', 'id'), ('crm_order', 'total_amount')})
+
+    def test_nested_customer_is_joined(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = execute('{ allOrders(first: 5) { edges { node { totalAmount customer { name } } } } }')
+        self.assertEqual(len(queries), 1)
+        self.assertIn('JOIN "crm_customer"', queries[0]['sql'])
+        self.assertEqual(selected_columns(queries[0]['sql']), {
+            ('crm_order', 'id'),
+            ('crm_order', 'total_amount'),
+            ('crm_order', 'customer_id'),
+            ('crm_customer', 'id'),
+            ('crm_customer', 'name'),
+        })
+        self.assertTrue(all(edge['node']['customer']['name'] for edge in data['allOrders']['edges']))
+
+
+class DocumentCacheTests(SimpleTestCase):
+    INVALID = '{ allOrders { edges { node { noSuchField } } } }'
+
+    def setUp(self):
+        self.cache = DocumentCache(maxsize=2)
+        self.schema = graphene_settings.SCHEMA.graphql_schema
+
+    def test_hits_and_misses(self):
+        document, errors = self.cache.get(self.schema, '{ hello }')
+        self.assertEqual(errors, [])
+        self.assertIs(self.cache.get(self.schema, '{ hello }')[0], document)
+        self.assertEqual(self.cache.get(self.schema, '{ hello')[0], None)
+        self.assertEqual(self.cache.info(), {'hits': 1, 'misses': 2, 'size': 2, 'maxsize': 2})
+
+    def test_lru_eviction(self):
+        for query in ('{ hello }', '{ __typename }', '{ hello }', 'query { __typename hello }'):
+            self.cache.get(self.schema, query)
+        self.cache.get(self.schema, '{ hello }')
+        self.assertEqual(self.cache.info()['hits'], 2)
+        self.cache.get(self.schema, '{ __typename }')
+        self.assertEqual(self.cache.info()['misses'], 4)
+
+    def test_unvalidated_entry_is_not_served_to_validating_lookups(self):
+        document, errors = self.cache.get(self.schema, self.INVALID, validate=False)
+        self.assertIsNotNone(document)
+        self.assertEqual(errors, [])
+        document, errors = self.cache.get(self.schema, self.INVALID)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('noSuchField', errors[0].message)
+        self.assertEqual(self.cache.info()['misses'], 2)
+
+    def test_validation_rules_are_part_of_the_key(self):
+        self.cache.get(self.schema, '{ hello }')
+        _, errors = self.cache.get(self.schema, '{ hello }', validation_rules=[NoSchemaIntrospectionCustomRule])
+        self.assertEqual(errors, [])
+        _, errors = self.cache.get(self.schema, '{ __schema { types { name } } }', [NoSchemaIntrospectionCustomRule])
+        self.assertTrue(errors)
+        self.assertEqual(self.cache.info()['misses'], 3)
+
+
+@override_settings(GRAPHQL_GET_MAX_AGE=30)
+class PersistedQueryTests(TestCase):
+    QUERY = '{ hello }'
+
+    def setUp(self):
+        caches[persisted_queries.cache_alias].clear()
+
+    def get(self, sha256_hash, query=None, **headers):
+        params = {'extensions': json.dumps({'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}})}
+        if query is not None:
+            params['query'] = query
+        return self.client.get('/graphql', params, headers={'Accept': 'application/json', **headers})
+
+    def error_code(self, response):
+        return response.json()['errors'][0]['extensions']['code']
+
+    def test_register_then_hash_only_hit(self):
+        sha256_hash = query_hash(self.QUERY)
+        response = self.get(sha256_hash)
+        self.assertEqual(self.error_code(response), 'PERSISTED_QUERY_NOT_FOUND')
+        self.assertNotIn('max-age', response.get('Cache-Control', ''))
+
+        response = self.get(sha256_hash, self.QUERY)
+        self.assertEqual(response.json()['data'], {'hello': 'Hello, GraphQL!'})
+
+        response = self.get(sha256_hash)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'hello': 'Hello, GraphQL!'})
+        self.assertIn('max-age=30', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_authorized_get_is_not_public(self):
+        self.get(query_hash(self.QUERY), self.QUERY)
+        response = self.get(query_hash(self.QUERY), Authorization='Bearer token')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+
+    def test_hash_mismatch(self):
+        response = self.get(query_hash('{ __typename }'), self.QUERY)
+        self.assertEqual(self.error_code(response), 'PERSISTED_QUERY_HASH_MISMATCH')
+        # A mismatched document is not registered under either hash
+        self.assertEqual(self.error_code(self.get(query_hash('{ __typename }'))), 'PERSISTED_QUERY_NOT_FOUND')
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(timeout=60, stale_while_revalidate=30)
+        self.cache.cache.clear()
+        self.tags = frozenset([Customer._meta.label])
+
+    def test_invalidating_a_tag_turns_entries_into_misses(self):
+        execute = mock.Mock(return_value=ExecutionResult(data={'n': 1}))
+        self.cache.get_or_execute('key', self.tags, execute)
+        self.assertEqual(self.cache.get_or_execute('key', self.tags, execute).data, {'n': 1})
+        self.assertEqual(execute.call_count, 1)
+
+        self.cache.invalidate(Product)
+        self.cache.get_or_execute('key', self.tags, execute)
+        self.assertEqual(execute.call_count, 1)
+
+        self.cache.invalidate(Customer)
+        self.cache.get_or_execute('key', self.tags, execute)
+        self.assertEqual(execute.call_count, 2)
+
+    def test_errors_are_not_stored(self):
+        execute = mock.Mock(return_value=ExecutionResult(data=None, errors=[ValueError('boom')]))
+        self.cache.get_or_execute('key', self.tags, execute)
+        self.cache.get_or_execute('key', self.tags, execute)
+        self.assertEqual(execute.call_count, 2)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        self.cache.get_or_execute('key', self.tags, lambda: ExecutionResult(data={'n': 1}))
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return ExecutionResult(data={'n': 2})
+
+        created = self.cache.cache.get('key')['created']
+        with mock.patch('crm.response_cache.time.time', return_value=created + 70):
+            self.assertEqual(self.cache.lookup('key', self.tags, refresh).data, {'n': 1})
+        self.assertTrue(refreshed.wait(5))
+        for _ in range(100):
+            if self.cache.cache.get('key')['data'] == {'n': 2}:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.lookup('key', self.tags, refresh).data, {'n': 2})
+
+        # Past the stale window the entry is a plain miss
+        created = self.cache.cache.get('key')['created']
+        with mock.patch('crm.response_cache.time.time', return_value=created + 95):
+            self.assertIsNone(self.cache.lookup('key', self.tags, refresh))
+
+
+class ResponseCacheViewTests(TestCase):
+    QUERY = json.dumps({'query': '{ allCustomers { edges { node { name } } } }'})
+
+    def setUp(self):
+        response_cache.cache.clear()
+        Customer.objects.create(name='Ada', email='ada@example.com')
+
+    def names(self):
+        response = self.client.post('/graphql', self.QUERY, content_type='application/json')
+        return [edge['node']['name'] for edge in response.json()['data']['allCustomers']['edges']]
+
+    def test_query_after_write_sees_the_write(self):
+        self.assertTrue(response_cache.enabled)
+        self.assertEqual(self.names(), ['Ada'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Ada'])
+
+        mutation = 'mutation { createCustomer(name: "Grace", email: "grace@example.com") { success } }'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/graphql', json.dumps({'query': mutation}), content_type='application/json')
+        self.assertTrue(response.json()['data']['createCustomer']['success'])
+        self.assertEqual(self.names(), ['Ada', 'Grace'])
+
+
+class Leaf(graphene.ObjectType):
+    name = graphene.String()
+
+
+class Branch(graphene.ObjectType):
+    leaves = graphene.List(Leaf)
+
+
+class Twig(graphene.ObjectType):
+    leaf = graphene.Field(Leaf)
+
+
+class Growth(graphene.Union):
+    class Meta:
+        types = (Branch, Twig)
+
+
+class GrowthQuery(graphene.ObjectType):
+    growth = graphene.List(Growth)
+
+
+class CostAnalyzerTests(SimpleTestCase):
+    def cost(self, analyzer, schema, query):
+        document = parse(query)
+        return analyzer.cost(schema.graphql_schema, document, document.definitions[0])
+
+    def test_union_costs_its_most_expensive_member(self):
+        schema = graphene.Schema(query=GrowthQuery)
+        query = '{ growth { ... on Branch { leaves { name } } ... on Twig { leaf { name } } } }'
+        # 10 unions, each the Branch: 1 + 10 leaves
+        self.assertEqual(self.cost(CostAnalyzer(default_fanout=10), schema, query), 10 * (1 + 10))
+        analyzer = CostAnalyzer(default_fanout=10, fanout={'Branch.leaves': 0})
+        self.assertEqual(self.cost(analyzer, schema, query), 10 * (1 + 1))
+
+    def test_connection_edges_cost_the_page_size(self):
+        query = '{ allOrders(first: 50) { edges { node { customer { name } products { name } } } } }'
+        analyzer = CostAnalyzer(fanout={'OrderType.products': 5})
+        # allOrders + 50 edges, each a node with its customer and 5 products
+        self.assertEqual(self.cost(analyzer, graphene_settings.SCHEMA, query), 1 + 50 * (1 + 1 + 1 + 5))
+
+
+class QueryCostViewTests(TestCase):
+    def post(self, query):
+        return self.client.post('/graphql', json.dumps({'query': query}), content_type='application/json')
+
+    def test_cost_is_reported(self):
+        response = self.post('{ allOrders(first: 2) { edges { node { id } } } }')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['extensions'], {'cost': {'requested': 5, 'maximum': 50000}})
+
+    def test_expensive_query_is_rejected_before_it_runs(self):
+        page = 'allOrders(first: 1000) { edges { node { customer { name } products { name } } } }'
+        query = '{ ' + ' '.join('o{}: {}'.format(i, page) for i in range(7)) + ' }'
+        with self.assertNumQueries(0):
+            response = self.post(query)
+        body = response.json()
+        self.assertIsNone(body.get('data'))
+        self.assertEqual(body['errors'][0]['extensions']['code'], 'QUERY_TOO_EXPENSIVE')
+        self.assertEqual(body['extensions'], {'cost': {'requested': 7 * 8001, 'maximum': 50000}})
+
+
+class BatchTests(TransactionTestCase):
+    NAMES = '{ allCustomers { edges { node { name } } } }'
+
+    def setUp(self):
+        response_cache.cache.clear()
+        Customer.objects.create(name='Ada', email='ada@example.com')
+
+    def post(self, batch):
+        return self.client.post('/graphql', json.dumps(batch), content_type='application/json')
+
+    def names(self, entry):
+        return [edge['node']['name'] for edge in entry['data']['allCustomers']['edges']]
+
+    def test_operations_run_in_order_around_mutations(self):
+        response = self.post([
+            {'id': 'before', 'query': self.NAMES},
+            {'id': 'count', 'query': '{ allCustomers { totalCount } }'},
+            {'id': 'create', 'query': 'mutation { createCustomer(name: "Grace", email: "grace@example.com") { success } }'},
+            {'id': 'after', 'query': self.NAMES},
+        ])
+        self.assertEqual(response.status_code, 200)
+        before, count, create, after = response.json()
+        self.assertEqual([entry['id'] for entry in (before, count, create, after)], ['before', 'count', 'create', 'after'])
+        self.assertEqual(self.names(before), ['Ada'])
+        self.assertEqual(count['data']['allCustomers']['totalCount'], 1)
+        self.assertTrue(create['data']['createCustomer']['success'])
+        self.assertEqual(self.names(after), ['Ada', 'Grace'])
+
+    def test_failed_entry_keeps_its_own_status(self):
+        response = self.post([
+            {'id': 'ok', 'query': self.NAMES},
+            {'id': 'syntax', 'query': '{ allCustomers {'},
+            {'id': 'empty'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        ok, syntax, empty = response.json()
+        self.assertEqual((ok['status'], self.names(ok)), (200, ['Ada']))
+        self.assertEqual(syntax['status'], 400)
+        self.assertIn('Syntax Error', syntax['errors'][0]['message'])
+        self.assertEqual(empty['status'], 400)
+        self.assertEqual(empty['errors'][0]['message'], 'Must provide query string.')
+
+    def test_batch_size_limit(self):
+        self.assertEqual(self.post([{'query': '{ hello }'}] * 10).status_code, 200)
+        response = self.post([{'query': '{ hello }'}] * 11)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['message'], 'Batch of 11 operations exceeds the maximum of 10.')
+        self.assertEqual(self.post([]).status_code, 400)
+
+
+class EncodingTests(TestCase):
+    QUERY = json.dumps({'query': '{ allOrders(first: 3) { edges { node { id orderDate totalAmount } } } }'})
+
+    @classmethod
+    def setUpTestData(cls):
+        create_orders(3)
+
+    def post(self, accept):
+        return self.client.post('/graphql', self.QUERY, content_type='application/json', headers={'Accept': accept})
+
+    def test_msgpack_is_negotiated_and_matches_json(self):
+        expected = self.post('application/json').json()
+        self.assertEqual(len(expected['data']['allOrders']['edges']), 3)
+        for content_type in encoding.MSGPACK_TYPES:
+            with self.subTest(content_type=content_type):
+                response = self.post(content_type)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn('Accept', response['Vary'])
+                self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_unknown_accept_falls_back_to_json(self):
+        response = self.post('text/plain, */*')
+        self.assertEqual(response['Content-Type'], encoding.JSON)
+        self.assertEqual(len(response.json()['data']['allOrders']['edges']), 3)
+
+    def test_decimal_and_datetime_encode_alike(self):
+        value = {
+            'amount': Decimal('1234567890.123456789'),
+            'at': datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=dt_timezone.utc),
+            'day': date(2024, 5, 6),
+        }
+        expected = {'amount': '1234567890.123456789', 'at': '2024-05-06T07:08:09.123456+00:00', 'day': '2024-05-06'}
+        self.assertEqual(json.loads(encoding.encode_json(value)), expected)
+        self.assertEqual(json.loads(encoding.encode_json(value, pretty=True)), expected)
+        with mock.patch.object(encoding, 'orjson', None):
+            self.assertEqual(json.loads(encoding.encode_json(value)), expected)
+        self.assertEqual(msgpack.unpackb(encoding.encode_msgpack(value)), expected)
+
+
+class IncrementalPayloadTests(TestCase):
+    QUERY = '''
+    query {
+      allOrders(first: 3) {
+        edges @stream(initialCount: 1) { node { id ... @defer(label: "amount") { totalAmount } } }
+      }
+    }
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [str(order.pk) for order in create_orders(3)]
+
+    def payloads(self, **headers):
+        response = self.client.post(
+            '/graphql', json.dumps({'query': self.QUERY}), content_type='application/json',
+            headers={'Accept': 'multipart/mixed', **headers},
+        )
+        self.assertTrue(response['Content-Type'].startswith('multipart/mixed'))
+        body = b''.join(response.streaming_content).decode()
+        parts = body.split('\r\n---')[1:-1]
+        return [json.loads(part.split('\r\n\r\n', 1)[1]) for part in parts]
+
+    def test_initial_items_defers_arrive_before_later_items(self):
+        self.maxDiff = None
+        deferred = [{'data': {'totalAmount': '{}.00'.format(i)}, 'path': ['allOrders', 'edges', i, 'node'],
+                     'label': 'amount'} for i in range(3)]
+        self.assertEqual(self.payloads(), [
+            {
+                'data': {'allOrders': {'edges': [{'node': {'id': self.ids[0]}}]}},
+                'hasNext': True,
+                'extensions': {'cost': {'requested': 7, 'maximum': 50000}},
+            },
+            {
+                'incremental': [
+                    deferred[0],
+                    {'items': [{'node': {'id': self.ids[1]}}, {'node': {'id': self.ids[2]}}],
+                     'path': ['allOrders', 'edges', 1]},
+                ],
+                'hasNext': True,
+            },
+            {'incremental': deferred[1:], 'hasNext': False},
+        ])
+
+    def test_sql_report_is_on_the_last_payload(self):
+        with override_settings(DEBUG=True):
+            payloads = self.payloads(**{'X-GraphQL-Debug': 'sql'})
+        self.assertNotIn('sql', payloads[0]['extensions'])
+        self.assertFalse(payloads[-1]['hasNext'])
+        self.assertGreater(payloads[-1]['extensions']['sql']['queries'], 0)
@@ -0,0 +1,614 @@
+import json
+from asyncio import gather
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import partial
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.encoding import force_bytes
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError, get_accepted_content_types
+from graphql import ExecutionResult, OperationType, execute, get_operation_ast, validate_schema
+from graphql.error import GraphQLError
+
+from .cost import cost_analyzer
+from .documents import document_cache
+from .encoding import JSON, encode_json, encode_msgpack, encoders
+from .execution import execute_concurrently, map_in_db_pool
+from .incremental import execute_incremental, has_incremental_directives
+from .loaders import Loaders
+from .persisted import persisted_queries, query_hash
+from .profiling import SQLAccountingMiddleware, wants_sql_report
+from .response_cache import document_profile, response_cache
+
+
+# A request that passed persisted-query lookup, parsing and validation.
+PreparedOperation = namedtuple(
+    'PreparedOperation',
+    'schema document operation_ast query variables operation_name execute_options cost',
+)
+
+MULTIPART = "multipart/mixed"
+MULTIPART_CONTENT_TYPE = 'multipart/mixed; boundary="-"; deferSpec=20220824'
+
+_batch_options = getattr(settings, 'GRAPHQL_BATCH', {})
+BATCH_MAX_SIZE = _batch_options.get('MAX_SIZE', 10)
+BATCH_PARALLEL = _batch_options.get('PARALLEL', True)
+
+
+def sql_accounting(prepared):
+    """The operation's SQLAccountingMiddleware, when a report was requested."""
+    for middleware in prepared.execute_options["middleware"] or ():
+        if isinstance(middleware, SQLAccountingMiddleware):
+            return middleware
+    return None
+
+
+def is_query(prepared):
+    operation_ast = prepared.operation_ast
+    return operation_ast is not None and operation_ast.operation == OperationType.QUERY
+
+
+class CRMGraphQLView(GraphQLView):
+    cost_analyzer = cost_analyzer
+    document_cache = document_cache
+    persisted_queries = persisted_queries
+    response_cache = response_cache
+
+    def dispatch(self, request, *args, **kwargs):
+        response = self.dispatch_incremental(request)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        return self.finalize_response(request, response)
+
+    def dispatch_incremental(self, request):
+        """Answer a query using @defer or @stream with a multipart/mixed stream.
+
+        Returns None for any other request, including ones that fail to
+        prepare, which the regular flow then answers. A single operation
+        that prepared is left on ``request.prepared_operation`` for the
+        regular flow to reuse.
+        """
+        if request.method not in ("GET", "POST") or MULTIPART not in get_accepted_content_types(request):
+            return None
+        try:
+            data = self.parse_body(request)
+            if isinstance(data, list):
+                return None
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            prepared = self.prepare_operation(request, data, query, variables, operation_name)
+        except HttpError:
+            return None
+        request.prepared_operation = prepared
+        if (
+            not isinstance(prepared, PreparedOperation)
+            or not is_query(prepared)
+            or not has_incremental_directives(prepared.document)
+        ):
+            return None
+        return StreamingHttpResponse(
+            self.multipart_parts(self.incremental_payloads(prepared)), content_type=MULTIPART_CONTENT_TYPE
+        )
+
+    def incremental_payloads(self, prepared):
+        """The payloads of an incremental response, with the JSON path's extensions.
+
+        The cost goes on the first payload. The SQL report is only complete
+        once every payload has run, so it goes on the last.
+        """
+        payloads = execute_incremental(prepared.schema, prepared.document, **prepared.execute_options)
+        accounting = sql_accounting(prepared)
+        for index, payload in enumerate(payloads):
+            if index == 0 and prepared.cost is not None:
+                payload["extensions"] = {"cost": self.cost_extension(prepared)}
+            if not payload["hasNext"] and accounting is not None:
+                payload["extensions"] = dict(payload.get("extensions") or {}, sql=accounting.report())
+            yield payload
+
+    def multipart_parts(self, payloads):
+        for payload in payloads:
+            for entry in [payload] + payload.get("incremental", []):
+                if "errors" in entry:
+                    entry["errors"] = [self.format_error(e) for e in entry["errors"]]
+            yield (
+                b"\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n"
+                + force_bytes(encode_json(payload))
+            )
+        yield b"\r\n-----\r\n"
+
+    def finalize_response(self, request, response):
+        if response.get("Content-Type") != JSON:
+            return response
+        response["Content-Type"] = self.response_content_type(request)
+        patch_vary_headers(response, ["Accept"])
+        max_age = getattr(settings, 'GRAPHQL_GET_MAX_AGE', 0)
+        if (
+            max_age
+            and request.method == "GET"
+            and response.status_code == 200
+            and "Authorization" not in request.headers
+        ):
+            patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+    def response_content_type(self, request):
+        """The first content type in ``Accept`` we can encode, else JSON."""
+        available = encoders()
+        for content_type in get_accepted_content_types(request):
+            if content_type in available:
+                return content_type
+        return JSON
+
+    def json_encode(self, request, d, pretty=False):
+        # Used for every response body, so MessagePack is negotiated here too
+        if self.response_content_type(request) != JSON:
+            return encode_msgpack(d)
+        return encode_json(d, pretty=self.pretty or pretty or bool(request.GET.get("pretty")))
+
+    def get_context(self, request):
+        # Operations of a batch share the request, and so its loaders
+        if getattr(request, "loaders", None) is None:
+            request.loaders = Loaders()
+        return request
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if not wants_sql_report(request):
+            return middleware
+        # One per operation, so each result of a batch reports its own SQL
+        return list(middleware or ()) + [SQLAccountingMiddleware()]
+
+    @classmethod
+    def can_display_graphiql(cls, request, data):
+        return not isinstance(data, list) and super().can_display_graphiql(request, data)
+
+    def parse_body(self, request):
+        if (
+            self.get_content_type(request) == "application/json"
+            and request.body.lstrip()[:1] == b"["
+        ):
+            try:
+                batch = json.loads(request.body.decode("utf-8"))
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+            return self.check_batch(batch)
+        return super().parse_body(request)
+
+    def check_batch(self, batch):
+        if not batch:
+            raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+        if BATCH_MAX_SIZE and len(batch) > BATCH_MAX_SIZE:
+            raise HttpError(HttpResponseBadRequest(
+                "Batch of {} operations exceeds the maximum of {}.".format(len(batch), BATCH_MAX_SIZE)
+            ))
+        if not all(isinstance(entry, dict) for entry in batch):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return batch
+
+    def get_document(self, query, trusted=False):
+        """Return ``(document, errors)`` for ``query``, parsed and validated."""
+        return self.document_cache.get(
+            self.schema.graphql_schema, query, self.validation_rules, validate=not trusted
+        )
+
+    def get_persisted_query(self, request, data):
+        """Return the ``persistedQuery`` extension of the request, if any."""
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        if not isinstance(extensions, dict):
+            return None
+        return extensions.get("persistedQuery")
+
+    def get_response(self, request, data, show_graphiql=False):
+        if isinstance(data, list):
+            return self.get_batch_response(request, data)
+
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+
+        return self.format_response(request, execution_result, id, show_graphiql)
+
+    def get_batch_response(self, request, batch):
+        """Execute a JSON array of operations and answer with an array.
+
+        Operations run in order. Consecutive queries run in parallel on the
+        database pool when BATCH_PARALLEL is set and no transaction is open;
+        a mutation waits for the queries before it and clears the shared
+        loaders, so later operations see its writes.
+        """
+        results = [None] * len(batch)
+        pending = []
+
+        def flush():
+            if BATCH_PARALLEL and len(pending) > 1 and not connection.in_atomic_block:
+                executed = map_in_db_pool(
+                    partial(self.execute_prepared, request), [prepared for _, prepared in pending]
+                )
+            else:
+                executed = [self.execute_prepared(request, prepared) for _, prepared in pending]
+            for (index, _), result in zip(pending, executed):
+                results[index] = result
+            pending.clear()
+
+        for index, data in enumerate(batch):
+            prepared = self.prepare_batch_entry(request, data)
+            if not isinstance(prepared, PreparedOperation):
+                results[index] = prepared
+            elif is_query(prepared):
+                pending.append((index, prepared))
+            else:
+                flush()
+                results[index] = self.execute_prepared(request, prepared)
+                request.loaders = None
+        flush()
+
+        return self.format_batch_response(request, batch, results)
+
+    def prepare_batch_entry(self, request, data):
+        """Prepare one operation of a batch; HTTP errors become its result."""
+        try:
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            return self.prepare_operation(request, data, query, variables, operation_name)
+        except HttpError as e:
+            return e
+
+    def format_batch_response(self, request, batch, results):
+        # Each entry carries its own status; the batch as a whole is a 200,
+        # so one failed entry does not hide the results of the others
+        responses = []
+        for data, result in zip(batch, results):
+            if isinstance(result, HttpError):
+                response = {"errors": [self.format_error(result)]}
+                status_code = result.response.status_code
+            else:
+                response, status_code = self.format_execution_result(request, result)
+            responses.append(dict(response or {}, id=data.get("id"), status=status_code))
+        return self.json_encode(request, responses), 200
+
+    def format_response(self, request, execution_result, id=None, show_graphiql=False):
+        response, status_code = self.format_execution_result(request, execution_result, id)
+        if response is None:
+            return None, status_code
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def format_execution_result(self, request, execution_result, id=None):
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        status_code = 200
+        response = None
+        if execution_result:
+            response = {}
+
+            if execution_result.errors:
+                set_rollback()
+                response["errors"] = [
+                    self.format_error(e) for e in execution_result.errors
+                ]
+
+            if execution_result.errors and any(
+                not getattr(e, "path", None) for e in execution_result.errors
+            ):
+                status_code = 400
+            else:
+                response["data"] = execution_result.data
+
+            if execution_result.extensions:
+                response["extensions"] = execution_result.extensions
+
+            if self.batch:
+                response["id"] = id
+                response["status"] = status_code
+
+        return response, status_code
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """Resolve persisted queries, then parse and validate the document.
+
+        Returns a PreparedOperation, or the ExecutionResult (or None) to
+        answer with when the request cannot be executed.
+        """
+        persisted = self.get_persisted_query(request, data)
+        sha256_hash = None
+        trusted = False
+        if persisted:
+            sha256_hash = persisted.get("sha256Hash")
+            if not isinstance(sha256_hash, str):
+                raise HttpError(HttpResponseBadRequest("persistedQuery requires a sha256Hash."))
+            if query:
+                if query_hash(query) != sha256_hash:
+                    return ExecutionResult(errors=[GraphQLError(
+                        "provided sha does not match query",
+                        extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+                    )])
+            else:
+                query, trusted = self.persisted_queries.get(sha256_hash)
+                if query is None:
+                    return ExecutionResult(errors=[GraphQLError(
+                        "PersistedQueryNotFound",
+                        extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    )])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        document, validation_errors = self.get_document(query, trusted)
+        if document is None:
+            return ExecutionResult(errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        cost = None
+        if operation_ast is not None:
+            try:
+                cost = self.cost_analyzer.cost(schema, document, operation_ast, variables)
+            except GraphQLError as e:
+                return ExecutionResult(errors=[e])
+            max_cost = self.cost_analyzer.max_cost
+            if max_cost and cost > max_cost:
+                return ExecutionResult(
+                    errors=[GraphQLError(
+                        "Query cost {} exceeds the maximum of {}.".format(cost, max_cost),
+                        extensions={"code": "QUERY_TOO_EXPENSIVE"},
+                    )],
+                    extensions={"cost": {"requested": cost, "maximum": max_cost}},
+                )
+
+        if sha256_hash and not trusted:
+            self.persisted_queries.register(sha256_hash, query)
+
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        return PreparedOperation(
+            schema, document, operation_ast, query, variables, operation_name, execute_options, cost
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # Same flow as GraphQLView, with automatic persisted queries,
+        # parse/validate served from the document cache and query results
+        # from the response cache.
+        prepared = getattr(request, "prepared_operation", None)
+        request.prepared_operation = None
+        if prepared is None or show_graphiql:
+            prepared = self.prepare_operation(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+        return self.execute_prepared(request, prepared)
+
+    def execute_prepared(self, request, prepared):
+        accounting = sql_accounting(prepared)
+        try:
+            with accounting.recording() if accounting else nullcontext():
+                result = self.run_operation(request, prepared)
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.add_extensions(result, prepared)
+
+    def add_extensions(self, result, prepared):
+        if prepared.cost is not None:
+            result.extensions = dict(result.extensions or {}, cost=self.cost_extension(prepared))
+        accounting = sql_accounting(prepared)
+        if accounting is not None:
+            result.extensions = dict(result.extensions or {}, sql=accounting.report())
+        return result
+
+    def cost_extension(self, prepared):
+        return {"requested": prepared.cost, "maximum": self.cost_analyzer.max_cost}
+
+    def run_operation(self, request, prepared):
+        schema, document, operation_ast = prepared.schema, prepared.document, prepared.operation_ast
+        execute_options = dict(prepared.execute_options)
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+
+        if (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.MUTATION
+            and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+            )
+        ):
+            with transaction.atomic():
+                result = execute(schema, document, **execute_options)
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+
+        if not is_query(prepared):
+            return execute(schema, document, **execute_options)
+
+        run = partial(execute, schema, document, **execute_options)
+        if not self.response_cache.enabled or sql_accounting(prepared):
+            return run()
+        key, tags = self.response_cache_key(request, prepared)
+        return self.response_cache.get_or_execute(key, tags, run)
+
+    def response_cache_key(self, request, prepared):
+        digest, tags = document_profile(prepared.schema, prepared.query)
+        key = self.response_cache.key(
+            request, digest, prepared.variables, prepared.operation_name
+        )
+        return key, tags
+
+
+async def iterate_in_thread(iterator):
+    # Django would otherwise buffer a sync iterator whole before sending it
+    sentinel = object()
+    iterator = iter(iterator)
+    while True:
+        part = await sync_to_async(next)(iterator, sentinel)
+        if part is sentinel:
+            return
+        yield part
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """GraphQL view for the ASGI app.
+
+    Query operations run on the event loop with their root fields resolved
+    concurrently on the database thread pool (see crm.execution). Parsing,
+    cache lookups and mutations still run in a worker thread, but no thread
+    is held while a query waits on the database.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in ("get", "post") or self.batch:
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        if MULTIPART in get_accepted_content_types(request):
+            response = await sync_to_async(super().dispatch)(request, *args, **kwargs)
+            if response.streaming and not response.is_async:
+                response.streaming_content = iterate_in_thread(response.streaming_content)
+            return response
+
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+            result, status_code = await self.get_response_async(request, data)
+            response = HttpResponse(
+                status=status_code, content=result, content_type="application/json"
+            )
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+        return self.finalize_response(request, response)
+
+    async def get_response_async(self, request, data):
+        if isinstance(data, list):
+            return await self.get_batch_response_async(request, data)
+
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = await self.execute_graphql_request_async(
+            request, data, query, variables, operation_name
+        )
+
+        return await sync_to_async(self.format_response)(request, execution_result, id)
+
+    async def get_batch_response_async(self, request, batch):
+        # As get_batch_response, with consecutive queries gathered on the loop
+        results = [None] * len(batch)
+        pending = []
+
+        async def flush():
+            if BATCH_PARALLEL:
+                executed = await gather(*(
+                    self.execute_prepared_async(request, prepared) for _, prepared in pending
+                ))
+            else:
+                executed = [
+                    await self.execute_prepared_async(request, prepared) for _, prepared in pending
+                ]
+            for (index, _), result in zip(pending, executed):
+                results[index] = result
+            pending.clear()
+
+        for index, data in enumerate(batch):
+            prepared = await sync_to_async(self.prepare_batch_entry)(request, data)
+            if not isinstance(prepared, PreparedOperation):
+                results[index] = prepared
+            elif is_query(prepared):
+                pending.append((index, prepared))
+            else:
+                await flush()
+                results[index] = await self.execute_prepared_async(request, prepared)
+                request.loaders = None
+        await flush()
+
+        return await sync_to_async(self.format_batch_response)(request, batch, results)
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        prepared = await sync_to_async(self.prepare_operation)(
+            request, data, query, variables, operation_name
+        )
+        if not isinstance(prepared, PreparedOperation):
+            return prepared
+        return await self.execute_prepared_async(request, prepared)
+
+    async def execute_prepared_async(self, request, prepared):
+        if not is_query(prepared):
+            return await sync_to_async(self.execute_prepared)(request, prepared)
+
+        try:
+            result = await self.run_query_async(request, prepared)
+        except Exception as e:
+            result = ExecutionResult(errors=[e])
+        return self.add_extensions(result, prepared)
+
+    async def run_query_async(self, request, prepared):
+        if not self.response_cache.enabled or sql_accounting(prepared):
+            return await self.execute_query_async(prepared)
+        key, tags = await sync_to_async(self.response_cache_key)(request, prepared)
+        refresh = async_to_sync(partial(self.execute_query_async, prepared))
+        result = await sync_to_async(self.response_cache.lookup)(key, tags, refresh)
+        if result is None:
+            versions = await sync_to_async(self.response_cache.tag_versions)(tags)
+            result = await self.execute_query_async(prepared)
+            await sync_to_async(self.response_cache.store)(key, versions, result)
+        return result
+
+    async def execute_query_async(self, prepared):
+        return await execute_concurrently(
+            prepared.schema, prepared.document, **prepared.execute_options
+        )